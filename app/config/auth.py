@@ -0,0 +1,22 @@
+import os
+import secrets
+from fastapi import HTTPException, Request
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def is_admin(request: Request) -> bool:
+    """True if the request carries the configured admin token."""
+    if not ADMIN_TOKEN:
+        return False
+    token = request.headers.get("X-Admin-Token", "")
+    return secrets.compare_digest(token, ADMIN_TOKEN)
+
+
+def require_admin(request: Request):
+    """FastAPI dependency that rejects non-admin callers."""
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
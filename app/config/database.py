@@ -1,33 +1,152 @@
+import asyncio
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
+from pymongo.errors import OperationFailure
+
+from config.monitoring import DbCommandListener, PoolStats
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 
+# ── Connection pool tuning ───────────────────────────────────
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+# How long startup keeps pinging until MIN_POOL_SIZE connections are open
+WARM_TIMEOUT_SECONDS = float(os.getenv("MONGO_WARM_TIMEOUT_SECONDS", "10"))
+WARM_POLL_SECONDS = 0.05
+# Comma-separated, in preference order, e.g. "zstd,snappy,zlib".
+# zstd needs `zstandard` and snappy needs `python-snappy` installed.
+COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+CANDIDATE_TTL_SECONDS = int(os.getenv("CANDIDATE_TTL_SECONDS", "3600"))
+
+# Readiness waits only on the connection; warm-up and indexes run in the background
+FAST_START = os.getenv("FAST_START", "").lower() in ("1", "true", "yes")
+
 client: AsyncIOMotorClient = None
 db = None
+pool_stats = PoolStats()
+pool_warm = False
+indexes_ready = False
+_startup_task = None
+
+
+def _pool_filled() -> bool:
+    return pool_stats.open >= max(MIN_POOL_SIZE, 1)
+
+
+async def _warm_pool():
+    """
+    Open MIN_POOL_SIZE connections up front. Concurrent pings can share a
+    few connections (pymongo caps how many open at once), so keep pinging
+    until the pool listener has actually seen MIN_POOL_SIZE opened, for up
+    to MONGO_WARM_TIMEOUT_SECONDS.
+    """
+    global pool_warm
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + WARM_TIMEOUT_SECONDS
+    while not _pool_filled():
+        if loop.time() >= deadline:
+            # pymongo keeps filling minPoolSize; get_pool_status re-checks
+            print(f"Connection pool not warm yet ({pool_stats.open}/{MIN_POOL_SIZE} open).")
+            return
+        await asyncio.gather(
+            *(client.admin.command("ping") for _ in range(max(MIN_POOL_SIZE, 1)))
+        )
+        await asyncio.sleep(WARM_POLL_SECONDS)
+    pool_warm = True
 
 
 async def connect_db():
     """Connect to MongoDB using Motor async driver."""
-    global client, db
-    client = AsyncIOMotorClient(MONGO_URI)
+    global client, db, _startup_task
+    options = {
+        "maxPoolSize": MAX_POOL_SIZE,
+        "minPoolSize": MIN_POOL_SIZE,
+        "maxIdleTimeMS": MAX_IDLE_TIME_MS,
+        "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+        "waitQueueTimeoutMS": WAIT_QUEUE_TIMEOUT_MS,
+    }
+    if COMPRESSORS:
+        options["compressors"] = COMPRESSORS
+    client = AsyncIOMotorClient(
+        MONGO_URI, event_listeners=[DbCommandListener(), pool_stats], **options
+    )
     # Extract database name from URI, fallback to "exam_allocation"
     db_name = MONGO_URI.rsplit("/", 1)[-1].split("?")[0] or "exam_allocation"
     db = client[db_name]
-    # Ping to verify connection
+    # Ping to verify connection, then pre-warm the pool and ensure indexes
     await client.admin.command("ping")
     print(f"MongoDB Connected: {client.address[0]}:{client.address[1]}")
-    # Ensure unique index on student USN
-    await db.students.create_index("usn", unique=True, sparse=True)
+    if FAST_START:
+        # Serve as soon as the connection works; finish warm-up meanwhile
+        _startup_task = asyncio.create_task(_finish_startup_in_background())
+    else:
+        await _finish_startup()
+
+
+async def _finish_startup():
+    await _warm_pool()
+    print(f"Connection pool warmed ({pool_stats.open} open).")
+    await ensure_indexes()
+
+
+async def _finish_startup_in_background():
+    try:
+        await _finish_startup()
+    except Exception as e:
+        print(f"Background startup failed: {e}")
+
+
+async def _ensure_unique_exam_index():
+    try:
+        await db.allocations.create_index("examId", unique=True)
+    except OperationFailure as e:
+        print(f"Could not create unique allocations.examId index (duplicates?): {e}")
+
+
+async def ensure_indexes():
+    """Create every index the app relies on (no-ops when they exist)."""
+    global indexes_ready
+    await asyncio.gather(
+        # Ensure unique index on student USN
+        db.students.create_index("usn", unique=True, sparse=True),
+        db.students.create_index("name"),
+        db.staffs.create_index("name"),
+        # Prefix-search fallback (case-sensitive anchored regexes on the
+        # lowercased name and its words) while the in-memory index loads
+        db.students.create_index("nameLower"),
+        db.staffs.create_index("nameLower"),
+        db.students.create_index("nameWords"),
+        db.staffs.create_index("nameWords"),
+        # One allocation per exam; generation leases and idempotency keys expire
+        _ensure_unique_exam_index(),
+        db.allocationlocks.create_index("expiresAt", expireAfterSeconds=0),
+        db.idempotencykeys.create_index("createdAt", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS),
+        db.allocationcandidates.create_index("createdAt", expireAfterSeconds=CANDIDATE_TTL_SECONDS),
+        db.ciaexams.create_index("date"),
+        # Multikey indexes to find allocations referencing a deleted document
+        db.allocations.create_index("roomAllocations.studentsAssigned"),
+        db.allocations.create_index("roomAllocations.staffAssigned"),
+        db.allocations.create_index("roomAllocations.room"),
+        db.allocationversions.create_index([("allocationId", 1), ("version", -1)], unique=True),
+    )
+    indexes_ready = True
     print("Indexes ensured.")
 
 
 async def close_db():
     """Close the MongoDB connection."""
-    global client
+    global client, pool_warm
+    pool_warm = False
+    if _startup_task:
+        _startup_task.cancel()
     if client:
         client.close()
         print("MongoDB connection closed.")
@@ -36,3 +155,39 @@ async def close_db():
 def get_db():
     """Return the database instance."""
     return db
+
+
+def get_pool_status():
+    """Return readiness and connection pool utilisation."""
+    global pool_warm
+    if client is not None and not pool_warm and _pool_filled():
+        pool_warm = True
+    stats = pool_stats.snapshot()
+    return {
+        "ready": client is not None and (pool_warm or FAST_START),
+        "fastStart": FAST_START,
+        "poolWarm": pool_warm,
+        "indexesReady": indexes_ready,
+        "pool": {
+            **stats,
+            "maxPoolSize": MAX_POOL_SIZE,
+            "minPoolSize": MIN_POOL_SIZE,
+            "utilisation": round(stats["inUse"] / MAX_POOL_SIZE, 3) if MAX_POOL_SIZE else 0,
+        },
+    }
+
+
+def supports_transactions() -> bool:
+    """Multi-document transactions need a replica set or sharded cluster."""
+    return client is not None and client.topology_description.topology_type_name != "Single"
+
+
+async def run_in_transaction(fn):
+    """
+    Await `fn(session)` inside a transaction when the deployment supports
+    one, otherwise call `fn(None)` and run its writes individually.
+    """
+    if not supports_transactions():
+        return await fn(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(fn)
@@ -0,0 +1,111 @@
+import threading
+import time
+from contextvars import ContextVar
+from pymongo import monitoring
+
+
+class RequestStats:
+    """Per-request counters for MongoDB round trips."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_calls = 0
+        self.db_time_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, duration_ms: float):
+        # Listener callbacks run on Motor's executor threads
+        with self._lock:
+            self.db_calls += 1
+            self.db_time_ms += duration_ms
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+# Motor copies the context into its executor, so the listener sees this var
+current_request_stats: ContextVar = ContextVar("current_request_stats", default=None)
+
+
+class DbCommandListener(monitoring.CommandListener):
+    """Attribute every MongoDB command to the request that issued it."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event.duration_micros)
+
+    def failed(self, event):
+        self._record(event.duration_micros)
+
+    @staticmethod
+    def _record(duration_micros: int):
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.record(duration_micros / 1000)
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Track connection pool utilisation and wait-queue depth."""
+
+    def __init__(self):
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+        self.max_waiting = 0
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "openConnections": self.open,
+                "inUse": self.in_use,
+                "idle": max(self.open - self.in_use, 0),
+                "waitQueue": self.waiting,
+                "maxWaitQueue": self.max_waiting,
+                "checkoutFailures": self.checkout_failures,
+            }
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
@@ -0,0 +1,48 @@
+import logging
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Optional budget (ms) for module import time; a warning is logged past it
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "0"))
+
+logger = logging.getLogger("exam_allocation.startup")
+
+_started = None
+_timings = {"importMs": None, "startupMs": None, "firstRequestMs": None}
+
+
+def record_imports(started: float):
+    """Record how long app imports took, measured from `started` (perf_counter)."""
+    global _started
+    _started = started
+    _timings["importMs"] = round((time.perf_counter() - started) * 1000, 1)
+    if IMPORT_BUDGET_MS and _timings["importMs"] > IMPORT_BUDGET_MS:
+        logger.warning(
+            "Import time %.1fms exceeds budget of %.1fms",
+            _timings["importMs"],
+            IMPORT_BUDGET_MS,
+        )
+
+
+def record_startup():
+    """Record when the lifespan startup finished (the app starts serving)."""
+    if _started is not None:
+        _timings["startupMs"] = round((time.perf_counter() - _started) * 1000, 1)
+        print(
+            f"Startup complete: imports {_timings['importMs']}ms, "
+            f"ready to serve {_timings['startupMs']}ms"
+        )
+
+
+def record_first_request():
+    """Record time-to-first-request; later calls are no-ops."""
+    if _started is not None and _timings["firstRequestMs"] is None:
+        _timings["firstRequestMs"] = round((time.perf_counter() - _started) * 1000, 1)
+        print(f"First request served after {_timings['firstRequestMs']}ms")
+
+
+def get_startup_timings() -> dict:
+    return dict(_timings)
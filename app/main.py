@@ -1,21 +1,49 @@
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
 import os
+import sys
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 
-from config.database import connect_db, close_db
-from routes import staff, students, classrooms, exams, allocations
+from config.database import connect_db, close_db, get_pool_status
+from config.startup import get_startup_timings, record_imports, record_startup
+from middleware.profiling import profile_requests
+from routes import staff, students, classrooms, exams, allocations, admin, stats, events, cycles
+from services.cascade import scan_orphans_periodically
+from services.counters import reconcile_periodically
+from services.events import watch_allocations
+from services.search_index import refresh_periodically, watch_search_indexes
 
 load_dotenv()
 
+record_imports(_import_started)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup / shutdown events for the FastAPI app."""
     await connect_db()
+    background = [
+        asyncio.create_task(reconcile_periodically()),
+        asyncio.create_task(refresh_periodically()),
+        asyncio.create_task(watch_search_indexes()),
+        asyncio.create_task(watch_allocations()),
+        asyncio.create_task(scan_orphans_periodically()),
+    ]
+    record_startup()
     yield
+    for task in background:
+        task.cancel()
+    # Imported lazily, so only present if a simulation ran
+    simulation = sys.modules.get("services.simulation")
+    if simulation:
+        simulation.shutdown_pool()
     await close_db()
 
 
@@ -32,7 +60,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id", "Idempotent-Replayed", "Retry-After"],
 )
+app.middleware("http")(profile_requests)
 
 
 # ── API Routes ───────────────────────────────────────────────
@@ -41,6 +71,10 @@ app.include_router(students.router, prefix="/api/students", tags=["Students"])
 app.include_router(classrooms.router, prefix="/api/classrooms", tags=["Classrooms"])
 app.include_router(exams.router, prefix="/api/exams", tags=["Exams"])
 app.include_router(allocations.router, prefix="/api/allocations", tags=["Allocations"])
+app.include_router(cycles.router, prefix="/api/cycles", tags=["Cycles"])
+app.include_router(events.router, prefix="/api/events", tags=["Events"])
+app.include_router(stats.router, prefix="/api/stats", tags=["Stats"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 
 # ── Health check ─────────────────────────────────────────────
@@ -55,10 +89,20 @@ async def health_check():
             "students": "/api/students",
             "exams": "/api/exams",
             "allocations": "/api/allocations",
+            "cycles": "/api/cycles",
+            "stats": "/api/stats",
+            "events": "/api/events/allocations",
         },
     }
 
 
+@app.get("/ready", tags=["Health"])
+async def readiness_check():
+    """Readiness probe — 503 until the pool is warm (just connected with FAST_START)."""
+    status = {**get_pool_status(), "startup": get_startup_timings()}
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
 # ── Global exception handler ─────────────────────────────────
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
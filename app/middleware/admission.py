@@ -0,0 +1,118 @@
+import asyncio
+import os
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ConcurrencyLimiter:
+    """
+    FastAPI dependency bounding how many requests run a route at once.
+
+    Up to `max_concurrent` requests run; up to `max_queue` more wait at most
+    `queue_timeout` seconds for a slot. Anything beyond that is rejected
+    immediately with 503 and a Retry-After header.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int,
+                 queue_timeout: float = 10.0, retry_after: int = 5):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._sem = asyncio.Semaphore(max_concurrent)
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy ({self.name}: {reason}), retry later",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    async def acquire(self):
+        """Take a slot, queueing or rejecting with 503 exactly like the dependency."""
+        if self._sem.locked() and self.waiting >= self.max_queue:
+            self._reject("queue full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject("queue timeout")
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self._sem.release()
+
+    async def __call__(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def streaming_response(self, body, **kwargs) -> StreamingResponse:
+        """
+        Wrap `body` in a StreamingResponse that keeps a slot taken with
+        acquire() until the response has been sent or abandoned.
+
+        Yield dependencies are torn down before a StreamingResponse body is
+        sent, so streamed routes acquire the slot themselves and hand it here.
+        """
+        return _LaneStreamingResponse(self, body, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "running": self.running,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "maxConcurrent": self.max_concurrent,
+            "maxQueue": self.max_queue,
+        }
+
+
+class _LaneStreamingResponse(StreamingResponse):
+    def __init__(self, lane: ConcurrencyLimiter, body, **kwargs):
+        super().__init__(body, **kwargs)
+        self.lane = lane
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.lane.release()
+
+
+def _limiter(name: str, env_prefix: str, concurrent: int, queue: int, timeout: float):
+    return ConcurrencyLimiter(
+        name,
+        max_concurrent=int(os.getenv(f"{env_prefix}_MAX_CONCURRENT", str(concurrent))),
+        max_queue=int(os.getenv(f"{env_prefix}_MAX_QUEUE", str(queue))),
+        queue_timeout=float(os.getenv(f"{env_prefix}_QUEUE_TIMEOUT", str(timeout))),
+    )
+
+
+# ── Lanes ────────────────────────────────────────────────────
+# Heavy: runs the allocation engine
+generate_lane = _limiter("generate", "GENERATE", 2, 8, 30.0)
+# Medium: populates allocations with rooms, staff and students
+populate_lane = _limiter("populate", "POPULATE", 8, 32, 10.0)
+# Cheap single-document lookups keep their own slots so they stay fast
+lookup_lane = _limiter("lookup", "LOOKUP", 64, 256, 2.0)
+
+LANES = [generate_lane, populate_lane, lookup_lane]
+
+
+def lane_stats():
+    """Return current usage of every admission lane."""
+    return [lane.stats() for lane in LANES]
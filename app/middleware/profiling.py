@@ -0,0 +1,112 @@
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from fastapi import Request
+from dotenv import load_dotenv
+
+from config.auth import is_admin
+from config.monitoring import RequestStats, current_request_stats
+from config.startup import record_first_request
+
+load_dotenv()
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+PROFILE_STORE_SIZE = int(os.getenv("PROFILE_STORE_SIZE", "20"))
+
+logger = logging.getLogger("exam_allocation.slow_requests")
+
+# Most recent profiles, oldest evicted first
+_profiles: "OrderedDict[str, dict]" = OrderedDict()
+_profiler_active = False
+
+
+def _profiling_requested(request: Request) -> bool:
+    flag = request.headers.get("X-Profile") or request.query_params.get("profile")
+    return flag in ("1", "true", "yes")
+
+
+def _route_path(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", request.url.path)
+
+
+def _store_profile(request: Request, profiler, stats: RequestStats) -> str:
+    import io
+    import pstats
+
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(60)
+    profile_id = uuid.uuid4().hex
+    _profiles[profile_id] = {
+        "route": f"{request.method} {_route_path(request)}",
+        "totalMs": round(stats.elapsed_ms(), 2),
+        "dbCalls": stats.db_calls,
+        "dbMs": round(stats.db_time_ms, 2),
+        "report": out.getvalue(),
+    }
+    while len(_profiles) > PROFILE_STORE_SIZE:
+        _profiles.popitem(last=False)
+    return profile_id
+
+
+def get_profile(profile_id: str):
+    """Return a stored profile by id, or None if it was evicted."""
+    return _profiles.get(profile_id)
+
+
+def list_profiles():
+    """Return summaries of stored profiles, newest first."""
+    return [
+        {"id": pid, **{k: v for k, v in p.items() if k != "report"}}
+        for pid, p in reversed(_profiles.items())
+    ]
+
+
+async def profile_requests(request: Request, call_next):
+    """
+    HTTP middleware:
+    - counts MongoDB calls and time spent in the database for every request
+    - logs any request slower than SLOW_REQUEST_MS
+    - for admins sending `X-Profile: 1` (or `?profile=1`), records a
+      cProfile call tree retrievable from /api/admin/profiles/{id}
+    """
+    global _profiler_active
+    stats = RequestStats()
+    token = current_request_stats.set(stats)
+
+    profiler = None
+    # cProfile sees the whole event loop thread, so only one profile at a time
+    if not _profiler_active and _profiling_requested(request) and is_admin(request):
+        import cProfile
+
+        profiler = cProfile.Profile()
+        _profiler_active = True
+        profiler.enable()
+
+    try:
+        response = await call_next(request)
+    finally:
+        if profiler:
+            profiler.disable()
+            _profiler_active = False
+        current_request_stats.reset(token)
+
+    total_ms = stats.elapsed_ms()
+    record_first_request()
+    response.headers["Server-Timing"] = (
+        f"db;dur={stats.db_time_ms:.1f}, total;dur={total_ms:.1f}"
+    )
+    if profiler:
+        response.headers["X-Profile-Id"] = _store_profile(request, profiler, stats)
+
+    if total_ms >= SLOW_REQUEST_MS:
+        logger.warning(
+            "Slow request: %s %s took %.1fms (db: %d calls, %.1fms)",
+            request.method,
+            _route_path(request),
+            total_ms,
+            stats.db_calls,
+            stats.db_time_ms,
+        )
+    return response
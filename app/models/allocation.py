@@ -3,6 +3,17 @@ from typing import Optional, List
 from datetime import datetime
 
 
+class SeatResponse(BaseModel):
+    student: str
+    row: int
+    column: int
+
+
+class SeatLayoutResponse(BaseModel):
+    rows: int
+    columns: int
+
+
 class RoomAllocationResponse(BaseModel):
     room: str
     roomNumber: str
@@ -10,6 +21,9 @@ class RoomAllocationResponse(BaseModel):
     capacity: int
     staffAssigned: List[str] = []
     studentsAssigned: List[str] = []
+    seatLayout: Optional[SeatLayoutResponse] = None
+    seats: List[SeatResponse] = []
+    adjacencyViolations: int = 0
 
 
 class AllocationResponse(BaseModel):
@@ -18,6 +32,10 @@ class AllocationResponse(BaseModel):
     roomAllocations: List[RoomAllocationResponse] = []
     totalStudentsAllocated: int = 0
     totalRoomsUsed: int = 0
+    totalStudents: int = 0
+    unallocatedCount: int = 0
+    adjacencyViolations: int = 0
+    version: int = 1
     createdAt: Optional[datetime] = None
     updatedAt: Optional[datetime] = None
 
@@ -1,18 +1,35 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional
 from datetime import datetime
 
 
+def check_layout(capacity: int, rows: Optional[int], columns: Optional[int]):
+    """Raise ValueError unless the seat grid is unset or complete and big enough."""
+    if (rows is None) != (columns is None):
+        raise ValueError("rows and columns must be given together")
+    if rows and rows * columns < capacity:
+        raise ValueError("rows x columns must be at least the capacity")
+
+
 class ClassroomCreate(BaseModel):
     roomNumber: str = Field(..., min_length=1, description="Room number")
     block: str = Field(..., min_length=1, description="Block")
     capacity: int = Field(..., ge=1, description="Seating capacity (minimum 1)")
+    rows: Optional[int] = Field(None, ge=1, description="Seat rows (optional layout)")
+    columns: Optional[int] = Field(None, ge=1, description="Seats per row (optional layout)")
+
+    @model_validator(mode="after")
+    def validate_layout(self):
+        check_layout(self.capacity, self.rows, self.columns)
+        return self
 
 
 class ClassroomUpdate(BaseModel):
     roomNumber: Optional[str] = None
     block: Optional[str] = None
     capacity: Optional[int] = Field(None, ge=1)
+    rows: Optional[int] = Field(None, ge=1)
+    columns: Optional[int] = Field(None, ge=1)
 
 
 class ClassroomResponse(BaseModel):
@@ -20,6 +37,8 @@ class ClassroomResponse(BaseModel):
     roomNumber: str
     block: str
     capacity: int
+    rows: Optional[int] = None
+    columns: Optional[int] = None
     createdAt: Optional[datetime] = None
     updatedAt: Optional[datetime] = None
 
@@ -0,0 +1,14 @@
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+
+
+class CyclePlanRequest(BaseModel):
+    startDate: datetime = Field(..., description="First exam date to include")
+    endDate: datetime = Field(..., description="Last exam date to include")
+    maxConcurrency: int = Field(2, ge=1, le=8, description="Exam dates generated in parallel")
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.endDate < self.startDate:
+            raise ValueError("endDate must not be before startDate")
+        return self
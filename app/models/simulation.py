@@ -0,0 +1,20 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+
+class StaffingRule(BaseModel):
+    staffPerRoom: int = Field(1, ge=0, description="Invigilators per regular room")
+    largeRoomThreshold: int = Field(40, ge=1, description="Capacity above which a room is large")
+    staffPerLargeRoom: int = Field(2, ge=0, description="Invigilators per large room")
+
+
+class SimulationRequest(BaseModel):
+    seeds: Optional[List[int]] = Field(None, description="Explicit seeds to try")
+    numSeeds: int = Field(8, ge=1, le=256, description="Random seeds to try if `seeds` is omitted")
+    roomSets: Optional[List[List[str]]] = Field(
+        None, description="Classroom id subsets to try (default: all classrooms)"
+    )
+    staffing: Optional[List[StaffingRule]] = Field(
+        None, description="Staffing rules to try (default: 1 per room, 2 above 40)"
+    )
+    top: int = Field(5, ge=1, le=20, description="Number of best candidates to return")
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from config.auth import require_admin
+from middleware.admission import lane_stats
+from middleware.profiling import get_profile, list_profiles
+from services.cascade import scan_orphans
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+# ── GET /profiles  —  List captured request profiles ─────────
+@router.get("/profiles")
+async def get_profiles():
+    profiles = list_profiles()
+    return {"success": True, "count": len(profiles), "data": profiles}
+
+
+# ── GET /profiles/{id}  —  Download a profile report ─────────
+@router.get("/profiles/{id}", response_class=PlainTextResponse)
+async def download_profile(id: str):
+    profile = get_profile(id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    header = (
+        f"{profile['route']}  total={profile['totalMs']}ms  "
+        f"db={profile['dbCalls']} calls / {profile['dbMs']}ms\n\n"
+    )
+    return PlainTextResponse(
+        header + profile["report"],
+        headers={"Content-Disposition": f'attachment; filename="profile-{id}.txt"'},
+    )
+
+
+# ── GET /limits  —  Admission lane usage ─────────────────────
+@router.get("/limits")
+async def get_limits():
+    return {"success": True, "data": lane_stats()}
+
+
+# ── POST /orphan-scan  —  Clean dangling allocation references
+@router.post("/orphan-scan")
+async def run_orphan_scan():
+    return {"success": True, "data": await scan_orphans()}
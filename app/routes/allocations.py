@@ -1,12 +1,46 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from bson import ObjectId
 from datetime import datetime
+from typing import Optional
+from pymongo.errors import DuplicateKeyError
 
-from config.database import get_db
+from config.database import get_db, run_in_transaction
+from middleware.admission import generate_lane, populate_lane
+from models.classroom import ClassroomResponse
+from models.exam import ExamResponse
+from models.simulation import SimulationRequest
+from models.staff import StaffResponse
+from models.student import StudentResponse
 from services.allocation_engine import generate_allocation
+from services.events import publish_allocation_event
+from services.generation_coordinator import (
+    GenerationBusy,
+    get_idempotent_response,
+    run_exclusive,
+    save_idempotent_response,
+)
+from services.projection import model_fields, parse_fields
+from services.versioning import (
+    VersionNotFound,
+    diff_versions,
+    list_versions,
+    rebuild_version,
+    VersionConflict,
+    record_deletion,
+    replace_allocation,
+)
 
 router = APIRouter()
 
+EXAM_FIELDS = model_fields(ExamResponse)
+CLASSROOM_FIELDS = model_fields(ClassroomResponse)
+STAFF_FIELDS = model_fields(StaffResponse)
+STUDENT_FIELDS = model_fields(StudentResponse)
+
+# Populated sub-documents default to the fields clients always needed
+DEFAULT_STAFF_PROJECTION = {"name": 1, "department": 1, "designation": 1}
+DEFAULT_STUDENT_PROJECTION = {"usn": 1, "name": 1, "semester": 1, "department": 1}
+
 
 def _stringify_ids(doc):
     """Recursively convert ObjectId values to strings in a document."""
@@ -20,7 +54,7 @@ def _stringify_ids(doc):
 
 
 # ── GET /  —  List all allocations ───────────────────────────
-@router.get("/")
+@router.get("/", dependencies=[Depends(populate_lane)])
 async def get_all_allocations():
     db = get_db()
     allocations = []
@@ -41,63 +75,257 @@ async def get_all_allocations():
     return {"success": True, "count": len(allocations), "data": allocations}
 
 
-# ── POST /generate/{exam_id}  —  Generate allocation for exam
-@router.post("/generate/{exam_id}", status_code=201)
-async def generate_exam_allocation(exam_id: str):
+def _generation_body(alloc_doc):
+    """Build the generate response from a stored allocation document."""
+    total_allocated = alloc_doc.get("totalStudentsAllocated", 0)
+    unallocated = alloc_doc.get("unallocatedCount", 0)
+    return {
+        "success": True,
+        "data": _stringify_ids(alloc_doc),
+        "summary": {
+            "totalStudents": alloc_doc.get("totalStudents", total_allocated + unallocated),
+            "totalStudentsAllocated": total_allocated,
+            "unallocatedCount": unallocated,
+            "totalRoomsUsed": alloc_doc.get("totalRoomsUsed", 0),
+            "adjacencyViolations": alloc_doc.get("adjacencyViolations", 0),
+        },
+    }
+
+
+async def _save_allocation(exam, result):
+    """Persist an engine result for an exam and return the generate response."""
+    db = get_db()
+    now = datetime.utcnow()
+    alloc_doc = {
+        "examId": exam["_id"],
+        "roomAllocations": result["roomAllocations"],
+        "totalStudentsAllocated": result["totalStudentsAllocated"],
+        "totalRoomsUsed": result["totalRoomsUsed"],
+        "totalStudents": result["totalStudents"],
+        "unallocatedCount": result["unallocatedCount"],
+        "adjacencyViolations": result["adjacencyViolations"],
+        "version": 1,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+    try:
+        insert_result = await db.allocations.insert_one(alloc_doc)
+    except DuplicateKeyError:
+        # Lost a race past an expired lease; the unique index kept one copy
+        return _generation_body(await db.allocations.find_one({"examId": exam["_id"]}))
+    alloc_doc["_id"] = insert_result.inserted_id
+    publish_allocation_event("created", exam["_id"], alloc_doc["_id"])
+    return _generation_body(alloc_doc)
+
+
+async def _load_exam_without_allocation(exam_id: str):
     db = get_db()
     if not ObjectId.is_valid(exam_id):
         raise HTTPException(status_code=400, detail="Invalid exam ID format")
-
     exam = await db.ciaexams.find_one({"_id": ObjectId(exam_id)})
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
-
-    # Check if allocation already exists
-    existing = await db.allocations.find_one({"examId": exam["_id"]})
+    existing = await db.allocations.find_one({"examId": exam["_id"]}, {"_id": 1})
     if existing:
         raise HTTPException(
             status_code=400,
             detail="Allocation already exists for this exam. Delete it first to regenerate.",
         )
+    return exam
+
+
+async def _run_generation(exam, generate, response: Response, newer_than=None):
+    async def load_existing(alloc):
+        return _generation_body(alloc)
+
+    try:
+        body, attached = await run_exclusive(
+            exam["_id"], generate, load_existing, newer_than=newer_than
+        )
+    except GenerationBusy:
+        raise HTTPException(
+            status_code=409,
+            detail="Allocation generation for this exam is still in progress",
+            headers={"Retry-After": "5"},
+        )
+    if attached:
+        response.status_code = 200
+    return body
+
+
+async def generate_for_exam(exam, exclude_rooms=None, exclude_staff=None):
+    """Generate and save an exam's allocation under its lease (used by cycle runs)."""
+    async def generate():
+        try:
+            result = await generate_allocation(exam["semester"], exclude_rooms, exclude_staff)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return await _save_allocation(exam, result)
+
+    async def load_existing(alloc):
+        return _generation_body(alloc)
+
+    body, _ = await run_exclusive(exam["_id"], generate, load_existing)
+    return body
+
+
+# ── POST /generate/{exam_id}  —  Generate allocation for exam
+@router.post("/generate/{exam_id}", status_code=201, dependencies=[Depends(generate_lane)])
+async def generate_exam_allocation(
+    exam_id: str,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+):
+    if not ObjectId.is_valid(exam_id):
+        raise HTTPException(status_code=400, detail="Invalid exam ID format")
+
+    # Replay the stored result for a retried request
+    if idempotency_key:
+        stored = await get_idempotent_response(idempotency_key)
+        if stored:
+            if stored["examId"] != exam_id:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key was already used for a different exam",
+                )
+            response.status_code = 200
+            response.headers["Idempotent-Replayed"] = "true"
+            return stored["body"]
+
+    exam = await _load_exam_without_allocation(exam_id)
+
+    async def generate():
+        # Run the allocation engine
+        try:
+            result = await generate_allocation(exam["semester"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return await _save_allocation(exam, result)
+
+    body = await _run_generation(exam, generate, response)
+    if idempotency_key:
+        await save_idempotent_response(idempotency_key, exam_id, body)
+    return body
+
+
+# ── POST /regenerate/{exam_id}  —  New version of an allocation
+@router.post("/regenerate/{exam_id}", dependencies=[Depends(generate_lane)])
+async def regenerate_exam_allocation(exam_id: str, response: Response):
+    db = get_db()
+    if not ObjectId.is_valid(exam_id):
+        raise HTTPException(status_code=400, detail="Invalid exam ID format")
+    exam = await db.ciaexams.find_one({"_id": ObjectId(exam_id)})
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    existing = await db.allocations.find_one({"examId": exam["_id"]}, {"version": 1})
+    if not existing:
+        raise HTTPException(status_code=404, detail="No allocation found for this exam")
+
+    async def generate():
+        try:
+            result = await generate_allocation(exam["semester"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        fields = {
+            "roomAllocations": result["roomAllocations"],
+            "totalStudentsAllocated": result["totalStudentsAllocated"],
+            "totalRoomsUsed": result["totalRoomsUsed"],
+            "totalStudents": result["totalStudents"],
+            "unallocatedCount": result["unallocatedCount"],
+            "adjacencyViolations": result["adjacencyViolations"],
+        }
+
+        async def write(session):
+            # Re-read under the lease so the delta is against the latest version
+            current = await db.allocations.find_one({"examId": exam["_id"]}, session=session)
+            if not current:
+                raise HTTPException(status_code=404, detail="No allocation found for this exam")
+            return {**current, **await replace_allocation(current, fields, session=session)}
+
+        try:
+            alloc = await run_in_transaction(write)
+        except VersionConflict:
+            raise HTTPException(
+                status_code=409,
+                detail="Allocation changed during regeneration, please retry",
+            )
+        publish_allocation_event("updated", exam["_id"], alloc["_id"])
+        return _generation_body(alloc)
+
+    # Another worker's regenerate counts only once it writes a newer version
+    return await _run_generation(
+        exam, generate, response, newer_than=existing.get("version", 1)
+    )
+
+
+# ── POST /simulate/{exam_id}  —  Dry-run and rank options ───
+@router.post("/simulate/{exam_id}", dependencies=[Depends(generate_lane)])
+async def simulate_exam_allocation(exam_id: str, request: SimulationRequest):
+    db = get_db()
+    if not ObjectId.is_valid(exam_id):
+        raise HTTPException(status_code=400, detail="Invalid exam ID format")
+    exam = await db.ciaexams.find_one({"_id": ObjectId(exam_id)})
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    # Imported on first use to keep the process pool machinery off cold start
+    from services.simulation import simulate
 
-    # Run the allocation engine
     try:
-        result = await generate_allocation(exam["semester"])
+        result = await simulate(exam, request)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "count": len(result["candidates"]), **result}
 
-    # Save to database
-    now = datetime.utcnow()
-    alloc_doc = {
-        "examId": exam["_id"],
-        "roomAllocations": result["roomAllocations"],
-        "totalStudentsAllocated": result["totalStudentsAllocated"],
-        "totalRoomsUsed": result["totalRoomsUsed"],
-        "createdAt": now,
-        "updatedAt": now,
-    }
-    insert_result = await db.allocations.insert_one(alloc_doc)
-    alloc_doc["_id"] = insert_result.inserted_id
 
+# ── POST /candidates/{id}/commit  —  Save a simulated candidate
+@router.post("/candidates/{id}/commit", status_code=201, dependencies=[Depends(generate_lane)])
+async def commit_candidate(id: str, response: Response):
+    db = get_db()
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    candidate = await db.allocationcandidates.find_one({"_id": ObjectId(id)})
+    if not candidate:
+        raise HTTPException(status_code=404, detail="Candidate not found or expired")
+
+    exam = await _load_exam_without_allocation(str(candidate["examId"]))
+
+    async def generate():
+        return await _save_allocation(exam, candidate["result"])
+
+    return await _run_generation(exam, generate, response)
+
+
+async def _fetch_by_ids(collection, ids, projection=None):
+    """Fetch many documents in one query, keyed by _id."""
+    if not ids:
+        return {}
     return {
-        "success": True,
-        "data": _stringify_ids(alloc_doc),
-        "summary": {
-            "totalStudents": result["totalStudents"],
-            "totalStudentsAllocated": result["totalStudentsAllocated"],
-            "unallocatedCount": result["unallocatedCount"],
-            "totalRoomsUsed": result["totalRoomsUsed"],
-        },
+        doc["_id"]: doc
+        async for doc in collection.find({"_id": {"$in": list(set(ids))}}, projection)
     }
 
 
 # ── GET /exam/{exam_id}  —  Get allocation by exam (populated)
-@router.get("/exam/{exam_id}")
-async def get_allocation_by_exam(exam_id: str):
+@router.get("/exam/{exam_id}", dependencies=[Depends(populate_lane)])
+async def get_allocation_by_exam(
+    exam_id: str,
+    examFields: Optional[str] = Query(None, description="Exam fields to populate"),
+    roomFields: Optional[str] = Query(None, description="Classroom fields to populate"),
+    staffFields: Optional[str] = Query(None, description="Staff fields to populate"),
+    studentFields: Optional[str] = Query(None, description="Student fields to populate"),
+):
     db = get_db()
     if not ObjectId.is_valid(exam_id):
         raise HTTPException(status_code=400, detail="Invalid exam ID format")
 
+    exam_projection = parse_fields(examFields, EXAM_FIELDS, "examFields")
+    room_projection = parse_fields(roomFields, CLASSROOM_FIELDS, "roomFields")
+    staff_projection = parse_fields(staffFields, STAFF_FIELDS, "staffFields") or DEFAULT_STAFF_PROJECTION
+    student_projection = (
+        parse_fields(studentFields, STUDENT_FIELDS, "studentFields") or DEFAULT_STUDENT_PROJECTION
+    )
+
     alloc = await db.allocations.find_one({"examId": ObjectId(exam_id)})
     if not alloc:
         raise HTTPException(
@@ -105,59 +333,155 @@ async def get_allocation_by_exam(exam_id: str):
         )
 
     # Populate exam
-    exam = await db.ciaexams.find_one({"_id": alloc["examId"]})
+    exam = await db.ciaexams.find_one({"_id": alloc["examId"]}, exam_projection)
     if exam:
         alloc["examId"] = _stringify_ids(exam)
 
-    # Populate room allocations
-    for ra in alloc.get("roomAllocations", []):
-        # Populate room
-        if ra.get("room"):
-            room = await db.classrooms.find_one({"_id": ra["room"]})
-            if room:
-                ra["room"] = _stringify_ids(room)
-
-        # Populate staff
-        populated_staff = []
-        for staff_id in ra.get("staffAssigned", []):
-            staff = await db.staffs.find_one({"_id": staff_id})
-            if staff:
-                populated_staff.append(
-                    {
-                        "_id": str(staff["_id"]),
-                        "name": staff.get("name"),
-                        "department": staff.get("department"),
-                        "designation": staff.get("designation"),
-                    }
-                )
-        ra["staffAssigned"] = populated_staff
-
-        # Populate students
-        populated_students = []
-        for student_id in ra.get("studentsAssigned", []):
-            student = await db.students.find_one({"_id": student_id})
-            if student:
-                populated_students.append(
-                    {
-                        "_id": str(student["_id"]),
-                        "usn": student.get("usn"),
-                        "name": student.get("name"),
-                        "semester": student.get("semester"),
-                        "department": student.get("department"),
-                    }
-                )
-        ra["studentsAssigned"] = populated_students
+    # Populate rooms, staff and students — one query per collection
+    room_allocs = alloc.get("roomAllocations", [])
+    rooms = await _fetch_by_ids(
+        db.classrooms, [ra["room"] for ra in room_allocs if ra.get("room")], room_projection
+    )
+    staff = await _fetch_by_ids(
+        db.staffs, [sid for ra in room_allocs for sid in ra.get("staffAssigned", [])], staff_projection
+    )
+    students = await _fetch_by_ids(
+        db.students, [sid for ra in room_allocs for sid in ra.get("studentsAssigned", [])], student_projection
+    )
+
+    for ra in room_allocs:
+        if ra.get("room") in rooms:
+            ra["room"] = rooms[ra["room"]]
+        ra["staffAssigned"] = [staff[sid] for sid in ra.get("staffAssigned", []) if sid in staff]
+        ra["studentsAssigned"] = [
+            students[sid] for sid in ra.get("studentsAssigned", []) if sid in students
+        ]
 
     return {"success": True, "data": _stringify_ids(alloc)}
 
 
+# ── GET /exam/{exam_id}/export  —  Seating charts / door list
+@router.get("/exam/{exam_id}/export")
+async def export_allocation(
+    exam_id: str,
+    format: str = Query("csv", pattern="^(csv|xlsx|pdf)$"),
+    view: str = Query("rooms", pattern="^(rooms|doorlist)$"),
+):
+    # Imported on first use to keep the export stack off cold start
+    from services.export import (
+        MEDIA_TYPES,
+        ExportDependencyMissing,
+        build_document,
+        load_seating,
+        stream_csv,
+    )
+
+    db = get_db()
+    if not ObjectId.is_valid(exam_id):
+        raise HTTPException(status_code=400, detail="Invalid exam ID format")
+
+    # Not a dependency: the populate slot must stay held while the body
+    # streams, so the response releases it once it has been sent
+    await populate_lane.acquire()
+    try:
+        rooms = await load_seating(ObjectId(exam_id))
+        if rooms is None:
+            raise HTTPException(
+                status_code=404, detail="No allocation found for this exam"
+            )
+        exam = await db.ciaexams.find_one({"_id": ObjectId(exam_id)}, {"examName": 1})
+        title = exam.get("examName", "Allocation") if exam else "Allocation"
+
+        if format == "csv":
+            body = stream_csv(rooms, view)
+        else:
+            try:
+                body = await build_document(rooms, format, view, title)
+            except ExportDependencyMissing as e:
+                raise HTTPException(status_code=501, detail=str(e))
+    except BaseException:
+        populate_lane.release()
+        raise
+
+    filename = f"allocation-{exam_id}-{view}.{format}"
+    return populate_lane.streaming_response(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# ── GET /{id}/versions  —  Version history ──────────────────
+@router.get("/{id}/versions")
+async def get_allocation_versions(id: str):
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    history = await list_versions(ObjectId(id))
+    if history is None:
+        raise HTTPException(status_code=404, detail="Allocation not found")
+    return {"success": True, "count": len(history["versions"]), "data": _stringify_ids(history)}
+
+
+# ── GET /{id}/versions/{version}  —  Rebuild a past version ──
+@router.get("/{id}/versions/{version}", dependencies=[Depends(populate_lane)])
+async def get_allocation_version(id: str, version: int):
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    try:
+        alloc = await rebuild_version(ObjectId(id), version)
+    except VersionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e) or "Version not found")
+    return {"success": True, "data": _stringify_ids(alloc)}
+
+
+# ── GET /{id}/diff  —  Changes between two versions ─────────
+@router.get("/{id}/diff", dependencies=[Depends(populate_lane)])
+async def diff_allocation_versions(
+    id: str,
+    from_version: int = Query(..., alias="from", ge=1),
+    to_version: int = Query(..., alias="to", ge=1),
+):
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    try:
+        diff = await diff_versions(ObjectId(id), from_version, to_version)
+    except VersionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e) or "Version not found")
+    return {
+        "success": True,
+        "from": from_version,
+        "to": to_version,
+        "data": _stringify_ids(diff),
+    }
+
+
 # ── DELETE /{id}  —  Delete allocation ───────────────────────
 @router.delete("/{id}")
 async def delete_allocation(id: str):
     db = get_db()
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    result = await db.allocations.find_one_and_delete({"_id": ObjectId(id)})
+
+    async def delete(session):
+        doc = await db.allocations.find_one({"_id": ObjectId(id)}, session=session)
+        if not doc:
+            return None
+        # Snapshot first: a failed delete leaves the allocation and its history intact
+        await record_deletion(doc, session=session)
+        deleted = await db.allocations.delete_one(
+            {"_id": doc["_id"], "version": doc.get("version")}, session=session
+        )
+        if not deleted.deleted_count:
+            raise VersionConflict()
+        return doc
+
+    try:
+        result = await run_in_transaction(delete)
+    except VersionConflict:
+        raise HTTPException(
+            status_code=409, detail="Allocation changed while deleting, please retry"
+        )
     if not result:
         raise HTTPException(status_code=404, detail="Allocation not found")
+    publish_allocation_event("deleted", result.get("examId"), result["_id"])
     return {"success": True, "data": {}}
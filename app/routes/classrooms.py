@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
+from typing import Optional
 
-from config.database import get_db
-from models.classroom import ClassroomCreate, ClassroomUpdate
+from config.database import get_db, run_in_transaction
+from middleware.admission import lookup_lane
+from models.classroom import ClassroomCreate, ClassroomUpdate, ClassroomResponse, check_layout
+from services.cascade import prune_allocations, publish_cascade
+from services.counters import record_change
+from services.projection import model_fields, parse_fields
 
 router = APIRouter()
 
+CLASSROOM_FIELDS = model_fields(ClassroomResponse)
+
 
 def classroom_doc_to_dict(doc):
     """Convert a MongoDB classroom document to a JSON-serialisable dict."""
@@ -16,20 +24,27 @@ def classroom_doc_to_dict(doc):
 
 # ── GET /  —  List all classrooms ────────────────────────────
 @router.get("/")
-async def get_all_classrooms():
+async def get_all_classrooms(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
     db = get_db()
-    cursor = db.classrooms.find().sort([("block", 1), ("roomNumber", 1)])
+    projection = parse_fields(fields, CLASSROOM_FIELDS)
+    cursor = db.classrooms.find({}, projection).sort([("block", 1), ("roomNumber", 1)])
     classrooms = [classroom_doc_to_dict(c) async for c in cursor]
     return {"success": True, "count": len(classrooms), "data": classrooms}
 
 
 # ── GET /{id}  —  Get single classroom ──────────────────────
-@router.get("/{id}")
-async def get_classroom(id: str):
+@router.get("/{id}", dependencies=[Depends(lookup_lane)])
+async def get_classroom(
+    id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
     db = get_db()
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    doc = await db.classrooms.find_one({"_id": ObjectId(id)})
+    projection = parse_fields(fields, CLASSROOM_FIELDS)
+    doc = await db.classrooms.find_one({"_id": ObjectId(id)}, projection)
     if not doc:
         raise HTTPException(status_code=404, detail="Classroom not found")
     return {"success": True, "data": classroom_doc_to_dict(doc)}
@@ -45,6 +60,7 @@ async def create_classroom(classroom: ClassroomCreate):
         result = await db.classrooms.insert_one(doc)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    await record_change("classrooms", after=doc)
     doc["_id"] = str(result.inserted_id)
     return {"success": True, "data": doc}
 
@@ -59,13 +75,36 @@ async def update_classroom(id: str, classroom: ClassroomUpdate):
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
     update_data["updatedAt"] = datetime.utcnow()
-    result = await db.classrooms.find_one_and_update(
-        {"_id": ObjectId(id)},
-        {"$set": update_data},
-        return_document=True,
+
+    # Validate the grid against the stored room, not just the fields sent
+    current = await db.classrooms.find_one(
+        {"_id": ObjectId(id)}, {"capacity": 1, "rows": 1, "columns": 1}
     )
-    if not result:
+    if not current:
         raise HTTPException(status_code=404, detail="Classroom not found")
+    merged = {**current, **update_data}
+    try:
+        check_layout(merged["capacity"], merged.get("rows"), merged.get("columns"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Only apply if the layout fields are still the ones just validated
+    before = await db.classrooms.find_one_and_update(
+        {
+            "_id": ObjectId(id),
+            "capacity": current["capacity"],
+            "rows": current.get("rows"),
+            "columns": current.get("columns"),
+        },
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not before:
+        raise HTTPException(
+            status_code=409, detail="Classroom changed while updating, please retry"
+        )
+    result = {**before, **update_data}
+    await record_change("classrooms", before=before, after=result)
     return {"success": True, "data": classroom_doc_to_dict(result)}
 
 
@@ -75,7 +114,17 @@ async def delete_classroom(id: str):
     db = get_db()
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    result = await db.classrooms.find_one_and_delete({"_id": ObjectId(id)})
+
+    async def delete(session):
+        doc = await db.classrooms.find_one_and_delete({"_id": ObjectId(id)}, session=session)
+        pruned = []
+        if doc:
+            pruned = await prune_allocations(rooms=[doc["_id"]], session=session)
+        return doc, pruned
+
+    result, pruned = await run_in_transaction(delete)
     if not result:
         raise HTTPException(status_code=404, detail="Classroom not found")
+    publish_cascade("updated", pruned)
+    await record_change("classrooms", before=result)
     return {"success": True, "data": {}}
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException
+from bson import ObjectId
+
+from config.database import get_db
+from models.cycle import CyclePlanRequest
+from routes.allocations import _stringify_ids, generate_for_exam
+from services.cycle_planner import plan_cycle, start_cycle
+
+router = APIRouter()
+
+
+def _summary(cycle):
+    counts = {}
+    for entry in cycle.get("exams", []):
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    return {**_stringify_ids(cycle), "progress": counts}
+
+
+# ── GET /  —  List cycle runs ────────────────────────────────
+@router.get("/")
+async def get_all_cycles():
+    db = get_db()
+    cursor = db.allocationcycles.find({}, {"exams": 0}).sort("createdAt", -1)
+    cycles = [_stringify_ids(c) async for c in cursor]
+    return {"success": True, "count": len(cycles), "data": cycles}
+
+
+# ── POST /  —  Plan and start a CIA cycle ────────────────────
+@router.post("/", status_code=202)
+async def create_cycle(request: CyclePlanRequest):
+    cycle = await plan_cycle(request.startDate, request.endDate, request.maxConcurrency)
+    if cycle["exams"]:
+        start_cycle(cycle["_id"], generate_for_exam)
+    return {"success": True, "data": _summary(cycle)}
+
+
+# ── GET /{id}  —  Cycle progress (per-exam checkpoints) ─────
+@router.get("/{id}")
+async def get_cycle(id: str):
+    db = get_db()
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    cycle = await db.allocationcycles.find_one({"_id": ObjectId(id)})
+    if not cycle:
+        raise HTTPException(status_code=404, detail="Cycle not found")
+    return {"success": True, "data": _summary(cycle)}
+
+
+# ── POST /{id}/resume  —  Continue from the last checkpoint ──
+@router.post("/{id}/resume", status_code=202)
+async def resume_cycle(id: str):
+    db = get_db()
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    cycle = await db.allocationcycles.find_one({"_id": ObjectId(id)})
+    if not cycle:
+        raise HTTPException(status_code=404, detail="Cycle not found")
+    if not start_cycle(cycle["_id"], generate_for_exam):
+        raise HTTPException(status_code=409, detail="Cycle is already running")
+    return {"success": True, "data": _summary(cycle)}
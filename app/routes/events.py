@@ -0,0 +1,39 @@
+import asyncio
+import json
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from services.events import bus
+
+router = APIRouter()
+
+HEARTBEAT_SECONDS = 15
+
+
+# ── GET /allocations  —  Server-Sent Events stream ──────────
+@router.get("/allocations")
+async def stream_allocation_events(
+    request: Request,
+    examId: Optional[str] = Query(None, description="Only events for this exam"),
+):
+    sub = bus.subscribe(examId)
+
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
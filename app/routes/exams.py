@@ -1,12 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from bson import ObjectId
 from datetime import datetime
+from typing import Optional
 
-from config.database import get_db
-from models.exam import ExamCreate, ExamUpdate
+from config.database import get_db, run_in_transaction
+from middleware.admission import lookup_lane
+from models.exam import ExamCreate, ExamUpdate, ExamResponse
+from services.cascade import delete_exam_allocations, publish_cascade
+from services.projection import model_fields, parse_fields
 
 router = APIRouter()
 
+EXAM_FIELDS = model_fields(ExamResponse)
+
 
 def exam_doc_to_dict(doc):
     """Convert a MongoDB exam document to a JSON-serialisable dict."""
@@ -16,20 +22,27 @@ def exam_doc_to_dict(doc):
 
 # ── GET /  —  List all exams ─────────────────────────────────
 @router.get("/")
-async def get_all_exams():
+async def get_all_exams(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
     db = get_db()
-    cursor = db.ciaexams.find().sort("date", -1)
+    projection = parse_fields(fields, EXAM_FIELDS)
+    cursor = db.ciaexams.find({}, projection).sort("date", -1)
     exams = [exam_doc_to_dict(e) async for e in cursor]
     return {"success": True, "count": len(exams), "data": exams}
 
 
 # ── GET /{id}  —  Get single exam ────────────────────────────
-@router.get("/{id}")
-async def get_exam(id: str):
+@router.get("/{id}", dependencies=[Depends(lookup_lane)])
+async def get_exam(
+    id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
     db = get_db()
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    doc = await db.ciaexams.find_one({"_id": ObjectId(id)})
+    projection = parse_fields(fields, EXAM_FIELDS)
+    doc = await db.ciaexams.find_one({"_id": ObjectId(id)}, projection)
     if not doc:
         raise HTTPException(status_code=404, detail="Exam not found")
     return {"success": True, "data": exam_doc_to_dict(doc)}
@@ -72,7 +85,16 @@ async def delete_exam(id: str):
     db = get_db()
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    result = await db.ciaexams.find_one_and_delete({"_id": ObjectId(id)})
+
+    async def delete(session):
+        doc = await db.ciaexams.find_one_and_delete({"_id": ObjectId(id)}, session=session)
+        deleted = []
+        if doc:
+            deleted = await delete_exam_allocations([doc["_id"]], session=session)
+        return doc, deleted
+
+    result, deleted = await run_in_transaction(delete)
     if not result:
         raise HTTPException(status_code=404, detail="Exam not found")
+    publish_cascade("deleted", deleted)
     return {"success": True, "data": {}}
@@ -1,44 +1,76 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
+from typing import Optional
 
-from config.database import get_db
-from models.staff import StaffCreate, StaffUpdate
+from config.database import get_db, run_in_transaction
+from middleware.admission import lookup_lane
+from models.staff import StaffCreate, StaffUpdate, StaffResponse
+from services.cascade import prune_allocations, publish_cascade
+from services.counters import record_change
+from services.projection import model_fields, parse_fields
+from services.search_index import NAME_KEYS, staff_index, with_name_key
 
 router = APIRouter()
 
+STAFF_FIELDS = model_fields(StaffResponse)
+
 
 def staff_doc_to_dict(doc):
     """Convert a MongoDB staff document to a JSON-serialisable dict."""
     doc["_id"] = str(doc["_id"])
+    for key in NAME_KEYS:
+        doc.pop(key, None)
     return doc
 
 
 # ── GET /  —  List all staff ─────────────────────────────────
 @router.get("/")
-async def get_all_staff():
+async def get_all_staff(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
     db = get_db()
-    cursor = db.staffs.find().sort("name", 1)
+    projection = parse_fields(fields, STAFF_FIELDS)
+    cursor = db.staffs.find({}, projection).sort("name", 1)
     staff = [staff_doc_to_dict(s) async for s in cursor]
     return {"success": True, "count": len(staff), "data": staff}
 
 
 # ── GET /available  —  List available staff ──────────────────
 @router.get("/available")
-async def get_available_staff():
+async def get_available_staff(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
     db = get_db()
-    cursor = db.staffs.find({"isAvailable": True}).sort("name", 1)
+    projection = parse_fields(fields, STAFF_FIELDS)
+    cursor = db.staffs.find({"isAvailable": True}, projection).sort("name", 1)
     staff = [staff_doc_to_dict(s) async for s in cursor]
     return {"success": True, "count": len(staff), "data": staff}
 
 
+# ── GET /search  —  Typeahead by name prefix ────────────────
+@router.get("/search", dependencies=[Depends(lookup_lane)])
+async def search_staff(
+    q: str = Query(..., min_length=1, description="Name prefix"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    staff, has_more = await staff_index.query(["name"], q, offset, limit)
+    return {"success": True, "count": len(staff), "hasMore": has_more, "data": staff}
+
+
 # ── GET /{id}  —  Get single staff member ────────────────────
-@router.get("/{id}")
-async def get_staff(id: str):
+@router.get("/{id}", dependencies=[Depends(lookup_lane)])
+async def get_staff(
+    id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
     db = get_db()
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    doc = await db.staffs.find_one({"_id": ObjectId(id)})
+    projection = parse_fields(fields, STAFF_FIELDS)
+    doc = await db.staffs.find_one({"_id": ObjectId(id)}, projection)
     if not doc:
         raise HTTPException(status_code=404, detail="Staff not found")
     return {"success": True, "data": staff_doc_to_dict(doc)}
@@ -49,10 +81,12 @@ async def get_staff(id: str):
 async def create_staff(staff: StaffCreate):
     db = get_db()
     now = datetime.utcnow()
-    doc = {**staff.model_dump(), "createdAt": now, "updatedAt": now}
+    doc = with_name_key({**staff.model_dump(), "createdAt": now, "updatedAt": now})
     result = await db.staffs.insert_one(doc)
+    await record_change("staff", after=doc)
     doc["_id"] = str(result.inserted_id)
-    return {"success": True, "data": doc}
+    staff_index.upsert(doc)
+    return {"success": True, "data": staff_doc_to_dict(doc)}
 
 
 # ── PUT /{id}  —  Update staff member ────────────────────────
@@ -65,13 +99,17 @@ async def update_staff(id: str, staff: StaffUpdate):
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
     update_data["updatedAt"] = datetime.utcnow()
-    result = await db.staffs.find_one_and_update(
+    with_name_key(update_data)
+    before = await db.staffs.find_one_and_update(
         {"_id": ObjectId(id)},
         {"$set": update_data},
-        return_document=True,
+        return_document=ReturnDocument.BEFORE,
     )
-    if not result:
+    if not before:
         raise HTTPException(status_code=404, detail="Staff not found")
+    result = {**before, **update_data}
+    await record_change("staff", before=before, after=result)
+    staff_index.upsert(result)
     return {"success": True, "data": staff_doc_to_dict(result)}
 
 
@@ -81,7 +119,18 @@ async def delete_staff(id: str):
     db = get_db()
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    result = await db.staffs.find_one_and_delete({"_id": ObjectId(id)})
+
+    async def delete(session):
+        doc = await db.staffs.find_one_and_delete({"_id": ObjectId(id)}, session=session)
+        pruned = []
+        if doc:
+            pruned = await prune_allocations(staff=[doc["_id"]], session=session)
+        return doc, pruned
+
+    result, pruned = await run_in_transaction(delete)
     if not result:
         raise HTTPException(status_code=404, detail="Staff not found")
+    publish_cascade("updated", pruned)
+    await record_change("staff", before=result)
+    staff_index.remove(id)
     return {"success": True, "data": {}}
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from config.auth import require_admin
+from services.counters import get_dashboard_stats, reconcile
+from services.generation_coordinator import GenerationBusy
+
+router = APIRouter()
+
+
+# ── GET /  —  Dashboard counters ─────────────────────────────
+@router.get("/")
+async def get_stats():
+    return {"success": True, "data": await get_dashboard_stats()}
+
+
+# ── POST /reconcile  —  Recount and fix counter drift ────────
+@router.post("/reconcile", dependencies=[Depends(require_admin)])
+async def reconcile_stats():
+    try:
+        await reconcile(wait_seconds=30)
+    except GenerationBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "data": await get_dashboard_stats()}
@@ -1,17 +1,27 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
 from typing import Optional, List
 
-from config.database import get_db
-from models.student import StudentCreate, StudentUpdate
+from config.database import get_db, run_in_transaction
+from middleware.admission import lookup_lane
+from models.student import StudentCreate, StudentUpdate, StudentResponse
+from services.cascade import prune_allocations, publish_cascade
+from services.counters import record_bulk_delete, record_bulk_insert, record_change
+from services.projection import model_fields, parse_fields
+from services.search_index import NAME_KEYS, student_index, with_name_key
 
 router = APIRouter()
 
+STUDENT_FIELDS = model_fields(StudentResponse)
+
 
 def student_doc_to_dict(doc):
     """Convert a MongoDB student document to a JSON-serialisable dict."""
     doc["_id"] = str(doc["_id"])
+    for key in NAME_KEYS:
+        doc.pop(key, None)
     return doc
 
 
@@ -20,6 +30,7 @@ def student_doc_to_dict(doc):
 async def get_all_students(
     semester: Optional[int] = Query(None, ge=1, le=8),
     department: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
 ):
     db = get_db()
     filter_query = {}
@@ -28,7 +39,8 @@ async def get_all_students(
     if department is not None:
         filter_query["department"] = department
 
-    cursor = db.students.find(filter_query).sort(
+    projection = parse_fields(fields, STUDENT_FIELDS)
+    cursor = db.students.find(filter_query, projection).sort(
         [("semester", 1), ("department", 1), ("usn", 1)]
     )
     students = [student_doc_to_dict(s) async for s in cursor]
@@ -36,22 +48,43 @@ async def get_all_students(
 
 
 # ── GET /usn/{usn}  —  Get student by USN ────────────────────
-@router.get("/usn/{usn}")
-async def get_student_by_usn(usn: str):
+@router.get("/usn/{usn}", dependencies=[Depends(lookup_lane)])
+async def get_student_by_usn(
+    usn: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
     db = get_db()
-    doc = await db.students.find_one({"usn": usn.upper()})
+    projection = parse_fields(fields, STUDENT_FIELDS)
+    doc = await db.students.find_one({"usn": usn.upper()}, projection)
     if not doc:
         raise HTTPException(status_code=404, detail="Student not found with this USN")
     return {"success": True, "data": student_doc_to_dict(doc)}
 
 
+# ── GET /search  —  Typeahead by USN / name prefix ───────────
+@router.get("/search", dependencies=[Depends(lookup_lane)])
+async def search_students(
+    q: str = Query(..., min_length=1, description="USN or name prefix"),
+    by: str = Query("any", pattern="^(usn|name|any)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    fields = ["usn", "name"] if by == "any" else [by]
+    students, has_more = await student_index.query(fields, q, offset, limit)
+    return {"success": True, "count": len(students), "hasMore": has_more, "data": students}
+
+
 # ── GET /{id}  —  Get single student ─────────────────────────
-@router.get("/{id}")
-async def get_student(id: str):
+@router.get("/{id}", dependencies=[Depends(lookup_lane)])
+async def get_student(
+    id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
     db = get_db()
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    doc = await db.students.find_one({"_id": ObjectId(id)})
+    projection = parse_fields(fields, STUDENT_FIELDS)
+    doc = await db.students.find_one({"_id": ObjectId(id)}, projection)
     if not doc:
         raise HTTPException(status_code=404, detail="Student not found")
     return {"success": True, "data": student_doc_to_dict(doc)}
@@ -62,13 +95,15 @@ async def get_student(id: str):
 async def create_student(student: StudentCreate):
     db = get_db()
     now = datetime.utcnow()
-    doc = {**student.model_dump(), "createdAt": now, "updatedAt": now}
+    doc = with_name_key({**student.model_dump(), "createdAt": now, "updatedAt": now})
     try:
         result = await db.students.insert_one(doc)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    await record_change("students", after=doc)
     doc["_id"] = str(result.inserted_id)
-    return {"success": True, "data": doc}
+    student_index.upsert(doc)
+    return {"success": True, "data": student_doc_to_dict(doc)}
 
 
 # ── POST /bulk  —  Bulk create students ──────────────────────
@@ -78,7 +113,7 @@ async def bulk_create_students(students: List[StudentCreate]):
     if not students:
         raise HTTPException(status_code=400, detail="Provide an array of students")
     now = datetime.utcnow()
-    docs = [{**s.model_dump(), "createdAt": now, "updatedAt": now} for s in students]
+    docs = [with_name_key({**s.model_dump(), "createdAt": now, "updatedAt": now}) for s in students]
     try:
         result = await db.students.insert_many(docs, ordered=False)
     except Exception as e:
@@ -87,9 +122,38 @@ async def bulk_create_students(students: List[StudentCreate]):
     inserted = []
     async for doc in db.students.find({"_id": {"$in": result.inserted_ids}}):
         inserted.append(student_doc_to_dict(doc))
+    await record_bulk_insert("students", inserted)
+    for doc in inserted:
+        student_index.upsert(doc)
     return {"success": True, "count": len(inserted), "data": inserted}
 
 
+# ── POST /bulk/delete  —  Bulk delete students ──────────────
+@router.post("/bulk/delete")
+async def bulk_delete_students(ids: List[str]):
+    db = get_db()
+    if not ids:
+        raise HTTPException(status_code=400, detail="Provide an array of student IDs")
+    if not all(ObjectId.is_valid(i) for i in ids):
+        raise HTTPException(status_code=400, detail="Invalid ID format")
+    object_ids = [ObjectId(i) for i in ids]
+
+    async def delete(session):
+        docs = [
+            d async for d in db.students.find({"_id": {"$in": object_ids}}, session=session)
+        ]
+        found = [d["_id"] for d in docs]
+        await db.students.delete_many({"_id": {"$in": found}}, session=session)
+        return docs, await prune_allocations(students=found, session=session)
+
+    deleted, pruned = await run_in_transaction(delete)
+    publish_cascade("updated", pruned)
+    await record_bulk_delete("students", deleted)
+    for doc in deleted:
+        student_index.remove(doc["_id"])
+    return {"success": True, "count": len(deleted), "data": {}}
+
+
 # ── PUT /{id}  —  Update student ─────────────────────────────
 @router.put("/{id}")
 async def update_student(id: str, student: StudentUpdate):
@@ -100,13 +164,17 @@ async def update_student(id: str, student: StudentUpdate):
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
     update_data["updatedAt"] = datetime.utcnow()
-    result = await db.students.find_one_and_update(
+    with_name_key(update_data)
+    before = await db.students.find_one_and_update(
         {"_id": ObjectId(id)},
         {"$set": update_data},
-        return_document=True,
+        return_document=ReturnDocument.BEFORE,
     )
-    if not result:
+    if not before:
         raise HTTPException(status_code=404, detail="Student not found")
+    result = {**before, **update_data}
+    await record_change("students", before=before, after=result)
+    student_index.upsert(result)
     return {"success": True, "data": student_doc_to_dict(result)}
 
 
@@ -116,7 +184,18 @@ async def delete_student(id: str):
     db = get_db()
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    result = await db.students.find_one_and_delete({"_id": ObjectId(id)})
+
+    async def delete(session):
+        doc = await db.students.find_one_and_delete({"_id": ObjectId(id)}, session=session)
+        pruned = []
+        if doc:
+            pruned = await prune_allocations(students=[doc["_id"]], session=session)
+        return doc, pruned
+
+    result, pruned = await run_in_transaction(delete)
     if not result:
         raise HTTPException(status_code=404, detail="Student not found")
+    publish_cascade("updated", pruned)
+    await record_change("students", before=result)
+    student_index.remove(id)
     return {"success": True, "data": {}}
@@ -1,81 +1,186 @@
+import heapq
+import math
 import random
+from collections import defaultdict
 from bson import ObjectId
 from config.database import get_db
 
 
-def shuffle(lst):
+DEFAULT_STAFFING = {"staffPerRoom": 1, "largeRoomThreshold": 40, "staffPerLargeRoom": 2}
+
+
+def shuffle(lst, rng=random):
     """Fisher-Yates shuffle — returns a new shuffled list."""
     arr = list(lst)
     for i in range(len(arr) - 1, 0, -1):
-        j = random.randint(0, i)
+        j = rng.randint(0, i)
         arr[i], arr[j] = arr[j], arr[i]
     return arr
 
 
-async def generate_allocation(semester: int):
+def interleave_departments(students, rng=random):
     """
-    Core allocation algorithm (port of allocationEngine.js):
+    Order students so every department is spread evenly through the list.
 
-    1. Fetch all students for the given semester
-    2. Shuffle them so students from different departments are mixed
-    3. Fetch all classrooms sorted by capacity (descending)
-    4. Distribute students across rooms without exceeding capacity
-    5. Assign available staff (1 per room; 2 if capacity > 40)
-    6. Return the allocation result
+    Each department is shuffled, then its k-th student (of n) is keyed at
+    (k + 0.5) / n and the whole list is sorted by that key — so any run of
+    consecutive students, and therefore any room, gets a proportional mix.
+    """
+    groups = defaultdict(list)
+    for s in students:
+        groups[s.get("department", "")].append(s)
+    keyed = []
+    for members in groups.values():
+        n = len(members)
+        for k, s in enumerate(shuffle(members, rng)):
+            keyed.append(((k + 0.5) / n, rng.random(), s))
+    keyed.sort(key=lambda t: (t[0], t[1]))
+    return [s for _, _, s in keyed]
+
+
+def room_layout(room):
+    """Return (rows, columns) for a room, inferring a near-square grid if unset."""
+    if room.get("rows") and room.get("columns"):
+        return room["rows"], room["columns"]
+    columns = max(1, math.ceil(math.sqrt(room["capacity"])))
+    return math.ceil(room["capacity"] / columns), columns
+
+
+def place_seats(students, rows: int, columns: int):
+    """
+    Assign students to grid seats (row-major) so that the students in front
+    and to the left come from a different department wherever possible.
 
-    Returns dict with: roomAllocations, totalStudentsAllocated,
-                       totalRoomsUsed, totalStudents, unallocatedCount
+    Greedy: at each seat take the department with the most students left
+    that does not clash with those two neighbours (max-heap, O(n log d)).
+    Returns (seats, violations) where violations counts same-department
+    pairs sitting side by side or front to back.
+    """
+    by_dept = defaultdict(list)
+    for s in students:
+        by_dept[str(s.get("department", ""))].append(s)
+    heap = [(-len(members), dept) for dept, members in by_dept.items()]
+    heapq.heapify(heap)
+
+    grid = [[None] * columns for _ in range(rows)]
+    seats = []
+    for idx in range(min(len(students), rows * columns)):
+        r, c = divmod(idx, columns)
+        avoid = set()
+        if c:
+            avoid.add(grid[r][c - 1])
+        if r:
+            avoid.add(grid[r - 1][c])
+
+        skipped = []
+        while heap and heap[0][1] in avoid:
+            skipped.append(heapq.heappop(heap))
+        # All remaining departments clash: take the largest, a violation is unavoidable
+        count, dept = heapq.heappop(heap) if heap else skipped.pop(0)
+        for item in skipped:
+            heapq.heappush(heap, item)
+        if count + 1 < 0:
+            heapq.heappush(heap, (count + 1, dept))
+
+        grid[r][c] = dept
+        seats.append({"student": by_dept[dept].pop()["_id"], "row": r + 1, "column": c + 1})
+
+    return seats, count_violations(grid)
+
+
+def count_violations(grid) -> int:
+    """Count same-department pairs side by side or front to back (None = empty seat)."""
+    violations = 0
+    for r, row in enumerate(grid):
+        for c, dept in enumerate(row):
+            if dept is None:
+                continue
+            if c + 1 < len(row) and row[c + 1] == dept:
+                violations += 1
+            if r + 1 < len(grid) and grid[r + 1][c] == dept:
+                violations += 1
+    return violations
+
+
+async def load_allocation_inputs(semester: int, projection=None, exclude_rooms=None, exclude_staff=None):
+    """
+    Fetch the engine's inputs: students of the semester, classrooms
+    (largest first) and available staff, minus any rooms/staff already
+    taken (e.g. by another exam on the same date). Raises ValueError if
+    any is empty.
     """
     db = get_db()
+    room_filter = {"_id": {"$nin": list(exclude_rooms)}} if exclude_rooms else {}
+    staff_filter = {"isAvailable": True}
+    if exclude_staff:
+        staff_filter["_id"] = {"$nin": list(exclude_staff)}
 
-    # 1. Fetch students
     students = []
-    async for s in db.students.find({"semester": semester}):
+    async for s in db.students.find({"semester": semester}, projection):
         students.append(s)
     if not students:
         raise ValueError(f"No students found for semester {semester}")
 
-    # 2. Shuffle to mix departments
-    shuffled_students = shuffle(students)
-
-    # 3. Fetch classrooms (largest first)
     classrooms = []
-    async for c in db.classrooms.find().sort("capacity", -1):
+    async for c in db.classrooms.find(room_filter).sort("capacity", -1):
         classrooms.append(c)
     if not classrooms:
         raise ValueError("No classrooms available")
 
-    # 4. Fetch available staff
     available_staff = []
-    async for s in db.staffs.find({"isAvailable": True}):
+    async for s in db.staffs.find(staff_filter, projection):
         available_staff.append(s)
     if not available_staff:
         raise ValueError("No staff available for duty")
-    shuffled_staff = shuffle(available_staff)
+
+    return students, classrooms, available_staff
+
+
+def compute_allocation(students, classrooms, available_staff, seed=None, staffing=None):
+    """
+    Pure, in-memory allocation over already-fetched inputs. The same seed
+    and inputs always give the same result. `staffing` overrides
+    DEFAULT_STAFFING (staffPerRoom, largeRoomThreshold, staffPerLargeRoom).
+    """
+    rng = random.Random(seed)
+    rules = {**DEFAULT_STAFFING, **(staffing or {})}
+
+    # 2. Interleave departments
+    shuffled_students = interleave_departments(students, rng)
+    shuffled_staff = shuffle(available_staff, rng)
 
     # 5. Distribute students across rooms
     room_allocations = []
     student_index = 0
     staff_index = 0
     total_students_allocated = 0
+    total_violations = 0
 
     for room in classrooms:
         if student_index >= len(shuffled_students):
             break  # all students allocated
 
         students_for_room = []
-        seats_to_fill = room["capacity"]
+        rows, columns = room_layout(room)
+        seats_to_fill = min(room["capacity"], rows * columns)
 
         while (
             len(students_for_room) < seats_to_fill
             and student_index < len(shuffled_students)
         ):
-            students_for_room.append(shuffled_students[student_index]["_id"])
+            students_for_room.append(shuffled_students[student_index])
             student_index += 1
 
+        # Seat placement on the room grid
+        seats, violations = place_seats(students_for_room, rows, columns)
+        total_violations += violations
+
         # 6. Assign staff
         staff_for_room = []
-        staff_needed = 2 if room["capacity"] > 40 else 1
+        if room["capacity"] > rules["largeRoomThreshold"]:
+            staff_needed = rules["staffPerLargeRoom"]
+        else:
+            staff_needed = rules["staffPerRoom"]
 
         for _ in range(staff_needed):
             if staff_index < len(shuffled_staff):
@@ -89,7 +194,10 @@ async def generate_allocation(semester: int):
                 "block": room["block"],
                 "capacity": room["capacity"],
                 "staffAssigned": staff_for_room,
-                "studentsAssigned": students_for_room,
+                "studentsAssigned": [seat["student"] for seat in seats],
+                "seatLayout": {"rows": rows, "columns": columns},
+                "seats": seats,
+                "adjacencyViolations": violations,
             }
         )
 
@@ -103,4 +211,28 @@ async def generate_allocation(semester: int):
         "totalRoomsUsed": len(room_allocations),
         "totalStudents": len(shuffled_students),
         "unallocatedCount": unallocated_count,
+        "adjacencyViolations": total_violations,
     }
+
+
+async def generate_allocation(semester: int, exclude_rooms=None, exclude_staff=None):
+    """
+    Core allocation algorithm (port of allocationEngine.js):
+
+    1. Fetch all students for the given semester
+    2. Interleave departments so every room gets a proportional mix
+    3. Fetch all classrooms sorted by capacity (descending)
+    4. Distribute students across rooms without exceeding capacity
+    5. Seat each room's students on its grid, keeping neighbours from
+       different departments where possible
+    6. Assign available staff (1 per room; 2 if capacity > 40)
+    7. Return the allocation result
+
+    Returns dict with: roomAllocations, totalStudentsAllocated,
+                       totalRoomsUsed, totalStudents, unallocatedCount,
+                       adjacencyViolations
+    """
+    students, classrooms, available_staff = await load_allocation_inputs(
+        semester, exclude_rooms=exclude_rooms, exclude_staff=exclude_staff
+    )
+    return compute_allocation(students, classrooms, available_staff)
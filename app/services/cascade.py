@@ -0,0 +1,214 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+
+from config.database import get_db
+from services.allocation_engine import count_violations
+from services.events import publish_allocation_event
+from services.versioning import VersionConflict, record_deletion, replace_allocation
+
+load_dotenv()
+
+ORPHAN_SCAN_INTERVAL_SECONDS = int(os.getenv("ORPHAN_SCAN_INTERVAL_SECONDS", "3600"))
+ORPHAN_SCAN_BATCH = 100
+
+PRUNE_ATTEMPTS = 3
+
+
+def _prune_rooms(alloc, students, staff, rooms):
+    """
+    Drop deleted rooms, students and staff from an allocation's rooms.
+    Returns (room_allocations, rooms_to_rescore) where rooms_to_rescore
+    are the indexes of gridded rooms that lost a seated student.
+    """
+    room_allocs, rescore = [], []
+    for ra in alloc.get("roomAllocations", []):
+        if ra.get("room") in rooms:
+            continue
+        ra = dict(ra)
+        assigned = ra.get("studentsAssigned", [])
+        ra["studentsAssigned"] = [sid for sid in assigned if sid not in students]
+        ra["staffAssigned"] = [sid for sid in ra.get("staffAssigned", []) if sid not in staff]
+        if "seats" in ra:
+            ra["seats"] = [seat for seat in ra["seats"] if seat["student"] not in students]
+        if len(ra["studentsAssigned"]) != len(assigned) and ra.get("seatLayout"):
+            rescore.append(len(room_allocs))
+        room_allocs.append(ra)
+    return room_allocs, rescore
+
+
+async def _pruned_fields(alloc, students, staff, rooms, session) -> dict:
+    """Allocation fields left after pruning, with every summary recounted."""
+    db = get_db()
+    room_allocs, rescore = _prune_rooms(alloc, students, staff, rooms)
+
+    # Empty seats can only remove clashes, but the count needs departments
+    seated = [seat["student"] for i in rescore for seat in room_allocs[i].get("seats", [])]
+    departments = {}
+    if seated:
+        departments = {
+            d["_id"]: str(d.get("department", ""))
+            async for d in db.students.find(
+                {"_id": {"$in": seated}}, {"department": 1}, session=session
+            )
+        }
+    for i in rescore:
+        ra = room_allocs[i]
+        layout = ra["seatLayout"]
+        grid = [[None] * layout["columns"] for _ in range(layout["rows"])]
+        for seat in ra.get("seats", []):
+            grid[seat["row"] - 1][seat["column"] - 1] = departments.get(seat["student"])
+        ra["adjacencyViolations"] = count_violations(grid)
+
+    old_allocated = alloc.get("totalStudentsAllocated", 0)
+    old_total = alloc.get("totalStudents", old_allocated + alloc.get("unallocatedCount", 0))
+    removed = sum(
+        sid in students
+        for ra in alloc.get("roomAllocations", [])
+        for sid in ra.get("studentsAssigned", [])
+    )
+    total = max(old_total - removed, 0)
+    allocated = sum(len(ra["studentsAssigned"]) for ra in room_allocs)
+    return {
+        "roomAllocations": room_allocs,
+        "totalStudentsAllocated": allocated,
+        "totalRoomsUsed": len(room_allocs),
+        # Students of a deleted room drop back to unallocated
+        "totalStudents": total,
+        "unallocatedCount": max(total - allocated, 0),
+        "adjacencyViolations": sum(ra.get("adjacencyViolations") or 0 for ra in room_allocs),
+    }
+
+
+async def _prune_one(alloc, students, staff, rooms, session):
+    """Write the pruned allocation as a new version, re-reading on a race."""
+    db = get_db()
+    for attempt in range(PRUNE_ATTEMPTS):
+        fields = await _pruned_fields(alloc, students, staff, rooms, session)
+        try:
+            await replace_allocation(alloc, fields, session=session)
+            return
+        except VersionConflict:
+            if attempt == PRUNE_ATTEMPTS - 1:
+                raise
+            alloc = await db.allocations.find_one({"_id": alloc["_id"]}, session=session)
+            if alloc is None:
+                return
+
+
+async def prune_allocations(students=(), staff=(), rooms=(), session=None) -> list:
+    """
+    Remove references to deleted students, staff and classrooms from every
+    allocation that holds them. Affected allocations are found through the
+    multikey indexes on roomAllocations.*, and each is saved as a new
+    version so its history still rebuilds. Returns (examId, allocationId)
+    pairs for publish_cascade, to be announced once the writes commit.
+    """
+    clauses = []
+    if students:
+        clauses.append({"roomAllocations.studentsAssigned": {"$in": list(students)}})
+    if staff:
+        clauses.append({"roomAllocations.staffAssigned": {"$in": list(staff)}})
+    if rooms:
+        clauses.append({"roomAllocations.room": {"$in": list(rooms)}})
+    if not clauses:
+        return []
+
+    db = get_db()
+    affected = [a async for a in db.allocations.find({"$or": clauses}, session=session)]
+    students, staff, rooms = set(students), set(staff), set(rooms)
+    for alloc in affected:
+        await _prune_one(alloc, students, staff, rooms, session)
+    return [(a.get("examId"), a["_id"]) for a in affected]
+
+
+async def delete_exam_allocations(exam_ids, session=None) -> list:
+    """
+    Delete the allocations (keeping their history) and candidates of exams.
+    Returns (examId, allocationId) pairs for publish_cascade.
+    """
+    db = get_db()
+    removed = []
+    async for alloc in db.allocations.find({"examId": {"$in": list(exam_ids)}}, session=session):
+        await record_deletion(alloc, session=session)
+        await db.allocations.delete_one({"_id": alloc["_id"]}, session=session)
+        removed.append((alloc["examId"], alloc["_id"]))
+    await db.allocationcandidates.delete_many({"examId": {"$in": list(exam_ids)}}, session=session)
+    return removed
+
+
+def publish_cascade(kind: str, changed):
+    """
+    Announce allocations changed by a cascade. Call this after
+    run_in_transaction returns: the transaction may be retried or aborted,
+    so publishing from inside it could send duplicates or phantom events.
+    """
+    for exam_id, allocation_id in changed:
+        publish_allocation_event(kind, exam_id, allocation_id)
+
+
+async def _missing(collection, ids):
+    """Ids from `ids` that no longer exist in `collection`."""
+    if not ids:
+        return set()
+    db = get_db()
+    found = {d["_id"] async for d in db[collection].find({"_id": {"$in": list(ids)}}, {"_id": 1})}
+    return set(ids) - found
+
+
+async def scan_orphans() -> dict:
+    """
+    Walk allocations in _id order, a batch at a time, and clean up
+    references to documents that were deleted before cascading existed.
+    """
+    db = get_db()
+    totals = {"scanned": 0, "allocationsPruned": 0, "allocationsDeleted": 0}
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id else {}
+        batch = [
+            a async for a in db.allocations.find(
+                query,
+                {"examId": 1, "roomAllocations.room": 1, "roomAllocations.studentsAssigned": 1,
+                 "roomAllocations.staffAssigned": 1},
+            ).sort("_id", 1).limit(ORPHAN_SCAN_BATCH)
+        ]
+        if not batch:
+            return totals
+        last_id = batch[-1]["_id"]
+        totals["scanned"] += len(batch)
+
+        exam_ids = {a["examId"] for a in batch if a.get("examId")}
+        rooms, students, staff = set(), set(), set()
+        for a in batch:
+            for ra in a.get("roomAllocations", []):
+                rooms.add(ra.get("room"))
+                students.update(ra.get("studentsAssigned", []))
+                staff.update(ra.get("staffAssigned", []))
+
+        missing_exams = await _missing("ciaexams", exam_ids)
+        if missing_exams:
+            deleted = await delete_exam_allocations(missing_exams)
+            publish_cascade("deleted", deleted)
+            totals["allocationsDeleted"] += len(deleted)
+        pruned = await prune_allocations(
+            students=await _missing("students", students),
+            staff=await _missing("staffs", staff),
+            rooms=await _missing("classrooms", rooms - {None}),
+        )
+        publish_cascade("updated", pruned)
+        totals["allocationsPruned"] += len(pruned)
+        # Let request handling interleave with a long scan
+        await asyncio.sleep(0)
+
+
+async def scan_orphans_periodically():
+    """Background task: run the orphan scan every interval."""
+    while True:
+        await asyncio.sleep(ORPHAN_SCAN_INTERVAL_SECONDS)
+        try:
+            result = await scan_orphans()
+            if result["allocationsPruned"] or result["allocationsDeleted"]:
+                print(f"Orphan scan: {result}")
+        except Exception as e:
+            print(f"Orphan scan failed: {e}")
@@ -0,0 +1,195 @@
+import asyncio
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+from config.database import get_db
+from services.generation_coordinator import GenerationBusy, hold_lease
+
+load_dotenv()
+
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("COUNTERS_RECONCILE_INTERVAL_SECONDS", "900"))
+DASHBOARD_ID = "dashboard"
+# One worker reconciles at a time (allocationlocks lease)
+RECONCILE_LEASE = "counters:reconcile"
+
+
+def _key(value) -> str:
+    """Make a value safe to use as a MongoDB field name."""
+    return str(value).replace(".", "_").replace("$", "_")
+
+
+def _student_fields(doc, sign: int) -> Counter:
+    return Counter({
+        "students.total": sign,
+        f"students.bySemester.{_key(doc.get('semester'))}.{_key(doc.get('department'))}": sign,
+    })
+
+
+def _staff_fields(doc, sign: int) -> Counter:
+    return Counter({
+        "staff.total": sign,
+        "staff.available": sign if doc.get("isAvailable") else 0,
+    })
+
+
+def _classroom_fields(doc, sign: int) -> Counter:
+    return Counter({
+        "classrooms.total": sign,
+        "classrooms.totalCapacity": sign * doc.get("capacity", 0),
+    })
+
+
+_FIELDS = {"students": _student_fields, "staff": _staff_fields, "classrooms": _classroom_fields}
+
+
+async def _apply(delta: Counter, kind: str):
+    inc = {k: v for k, v in delta.items() if v}
+    if not inc:
+        return
+    try:
+        await get_db().counters.update_one({"_id": DASHBOARD_ID}, {"$inc": inc}, upsert=True)
+    except Exception as e:
+        print(f"Counter update failed ({kind}): {e}")
+
+
+async def record_change(kind: str, before=None, after=None):
+    """
+    Apply a write to the dashboard counters with a single $inc.
+    Pass `after` for inserts, `before` for deletes and both for updates.
+    Failures are logged, not raised — the reconcile job corrects drift.
+    """
+    fields = _FIELDS[kind]
+    delta = Counter()
+    if before is not None:
+        delta.update(fields(before, -1))
+    if after is not None:
+        delta.update(fields(after, 1))
+    await _apply(delta, kind)
+
+
+async def record_bulk_insert(kind: str, docs):
+    """Apply many inserts as one $inc."""
+    fields = _FIELDS[kind]
+    delta = Counter()
+    for doc in docs:
+        delta.update(fields(doc, 1))
+    await _apply(delta, kind)
+
+
+async def record_bulk_delete(kind: str, docs):
+    """Apply many deletes as one $inc."""
+    fields = _FIELDS[kind]
+    delta = Counter()
+    for doc in docs:
+        delta.update(fields(doc, -1))
+    await _apply(delta, kind)
+
+
+def _flatten(doc: dict, prefix: str = "") -> dict:
+    """Numeric leaves of a nested document as {"a.b.c": value}."""
+    out = {}
+    for key, value in doc.items():
+        if isinstance(value, dict):
+            out.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[f"{prefix}{key}"] = value
+    return out
+
+
+async def reconcile(wait_seconds: float = 0):
+    """
+    Recount every collection and correct the dashboard counters.
+
+    Runs under a lease so only one worker reconciles at a time (raises
+    GenerationBusy if another holds it past `wait_seconds`). The fix is
+    applied as a $inc of (recount - counters read just after the recount),
+    not a replace, so $incs landing after that read are kept. Only writes
+    that race the aggregation itself can be miscounted, and the next
+    reconcile corrects them.
+    """
+    async with hold_lease(RECONCILE_LEASE, "Counters are already being reconciled", wait_seconds):
+        await _reconcile()
+
+
+async def _reconcile():
+    db = get_db()
+    by_semester = {}
+    students_total = 0
+    async for row in db.students.aggregate(
+        [{"$group": {"_id": {"semester": "$semester", "department": "$department"}, "n": {"$sum": 1}}}]
+    ):
+        sem = _key(row["_id"].get("semester"))
+        by_semester.setdefault(sem, {})[_key(row["_id"].get("department"))] = row["n"]
+        students_total += row["n"]
+
+    staff = {"total": 0, "available": 0}
+    async for row in db.staffs.aggregate(
+        [{"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "available": {"$sum": {"$cond": ["$isAvailable", 1, 0]}},
+        }}]
+    ):
+        staff = {"total": row["total"], "available": row["available"]}
+
+    classrooms = {"total": 0, "totalCapacity": 0}
+    async for row in db.classrooms.aggregate(
+        [{"$group": {"_id": None, "total": {"$sum": 1}, "totalCapacity": {"$sum": "$capacity"}}}]
+    ):
+        classrooms = {"total": row["total"], "totalCapacity": row["totalCapacity"]}
+
+    recount = _flatten({
+        "students": {"total": students_total, "bySemester": by_semester},
+        "staff": staff,
+        "classrooms": classrooms,
+    })
+    current = _flatten(await db.counters.find_one({"_id": DASHBOARD_ID}) or {})
+    correction = {
+        k: recount.get(k, 0) - current.get(k, 0)
+        for k in recount.keys() | current.keys()
+        if recount.get(k, 0) != current.get(k, 0)
+    }
+    update = {"$set": {"reconciledAt": datetime.utcnow()}}
+    if correction:
+        update["$inc"] = correction
+    await db.counters.update_one({"_id": DASHBOARD_ID}, update, upsert=True)
+
+
+async def reconcile_periodically():
+    """
+    Background task: reconcile on startup and then every interval. Every
+    worker runs it, so a worker skips its turn when another holds the
+    lease or reconciled within the last half interval.
+    """
+    while True:
+        try:
+            doc = await get_db().counters.find_one({"_id": DASHBOARD_ID}, {"reconciledAt": 1})
+            last = (doc or {}).get("reconciledAt")
+            if not last or datetime.utcnow() - last > timedelta(seconds=RECONCILE_INTERVAL_SECONDS / 2):
+                await reconcile()
+        except GenerationBusy:
+            pass
+        except Exception as e:
+            print(f"Counter reconcile failed: {e}")
+        await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+
+
+async def get_dashboard_stats() -> dict:
+    """Return the dashboard counters with a single document read."""
+    doc = await get_db().counters.find_one({"_id": DASHBOARD_ID}) or {}
+    doc.pop("_id", None)
+    by_semester = {
+        sem: {dept: n for dept, n in depts.items() if n}
+        for sem, depts in doc.get("students", {}).get("bySemester", {}).items()
+    }
+    return {
+        "students": {
+            "total": doc.get("students", {}).get("total", 0),
+            "bySemester": {sem: depts for sem, depts in by_semester.items() if depts},
+        },
+        "staff": {"total": 0, "available": 0, **doc.get("staff", {})},
+        "classrooms": {"total": 0, "totalCapacity": 0, **doc.get("classrooms", {})},
+        "reconciledAt": doc.get("reconciledAt"),
+    }
@@ -0,0 +1,200 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from typing import Awaitable, Callable, Dict
+
+from config.database import get_db
+from services.generation_coordinator import hold_lease
+
+# Cycle runs in this worker, keyed by cycle id
+_running: Dict[str, asyncio.Task] = {}
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+async def plan_cycle(start: datetime, end: datetime, max_concurrency: int):
+    """
+    Create a checkpoint document listing every exam in [start, end] (whole
+    days) that has no allocation yet. Returns the inserted cycle document.
+    """
+    db = get_db()
+    range_start, _ = _day_bounds(start.date())
+    _, range_end = _day_bounds(end.date())
+
+    exams = [
+        e async for e in db.ciaexams.find(
+            {"date": {"$gte": range_start, "$lt": range_end}},
+            {"date": 1, "semester": 1, "examName": 1},
+        ).sort("date", 1)
+    ]
+    allocated = {
+        a["examId"] async for a in db.allocations.find(
+            {"examId": {"$in": [e["_id"] for e in exams]}}, {"examId": 1}
+        )
+    }
+    now = datetime.utcnow()
+    cycle = {
+        "startDate": range_start,
+        "endDate": range_end,
+        "maxConcurrency": max_concurrency,
+        "status": "pending",
+        "exams": [
+            {
+                "examId": e["_id"],
+                "examName": e.get("examName"),
+                "date": e["date"],
+                "status": "pending",
+            }
+            for e in exams
+            if e["_id"] not in allocated
+        ],
+        "createdAt": now,
+        "updatedAt": now,
+    }
+    result = await db.allocationcycles.insert_one(cycle)
+    cycle["_id"] = result.inserted_id
+    return cycle
+
+
+async def _taken_on(day):
+    """Rooms and staff already allocated to any exam on this date."""
+    db = get_db()
+    day_start, day_end = _day_bounds(day)
+    exam_ids = [
+        e["_id"] async for e in db.ciaexams.find(
+            {"date": {"$gte": day_start, "$lt": day_end}}, {"_id": 1}
+        )
+    ]
+    rooms, staff = set(), set()
+    async for alloc in db.allocations.find(
+        {"examId": {"$in": exam_ids}},
+        {"roomAllocations.room": 1, "roomAllocations.staffAssigned": 1},
+    ):
+        for ra in alloc.get("roomAllocations", []):
+            rooms.add(ra["room"])
+            staff.update(ra.get("staffAssigned", []))
+    return rooms, staff
+
+
+async def _checkpoint(cycle_id, exam_id, fields: dict):
+    db = get_db()
+    await db.allocationcycles.update_one(
+        {"_id": cycle_id, "exams.examId": exam_id},
+        {
+            "$set": {
+                **{f"exams.$.{k}": v for k, v in fields.items()},
+                "updatedAt": datetime.utcnow(),
+            }
+        },
+    )
+
+
+async def _run_day(cycle_id, day, entries, generate_exam, limiter: asyncio.Semaphore):
+    """
+    Exams on one date share rooms and staff, so they run one after another
+    under a per-date lease, which also keeps overlapping cycles (in any
+    worker) from double-booking the same date. If the day stops early,
+    its unfinished exams are checkpointed as failed and the error re-raised.
+    """
+    remaining = list(entries)
+    async with limiter:
+        try:
+            async with hold_lease(
+                f"day:{day.isoformat()}",
+                f"Another cycle is still allocating exams on {day.isoformat()}",
+            ):
+                while remaining:
+                    await _run_entry(cycle_id, remaining[0], generate_exam)
+                    remaining.pop(0)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            for entry in remaining:
+                try:
+                    await _checkpoint(cycle_id, entry["examId"], {"status": "failed", "error": error})
+                except Exception:
+                    break  # the database is unreachable; the cycle is marked failed anyway
+            raise
+
+
+async def _run_entry(cycle_id, entry, generate_exam):
+    db = get_db()
+    exam = await db.ciaexams.find_one({"_id": entry["examId"]})
+    if not exam:
+        await _checkpoint(cycle_id, entry["examId"], {"status": "skipped", "error": "Exam deleted"})
+        return
+    if await db.allocations.find_one({"examId": exam["_id"]}, {"_id": 1}):
+        await _checkpoint(cycle_id, exam["_id"], {"status": "done"})
+        return
+    rooms, staff = await _taken_on(exam["date"].date())
+    try:
+        body = await generate_exam(exam, rooms, staff)
+    except Exception as e:
+        await _checkpoint(
+            cycle_id, exam["_id"],
+            {"status": "failed", "error": getattr(e, "detail", None) or str(e) or type(e).__name__},
+        )
+        return
+    await _checkpoint(
+        cycle_id, exam["_id"],
+        {"status": "done", "allocationId": body["data"]["_id"], "error": None},
+    )
+
+
+async def run_cycle(cycle_id, generate_exam: Callable[..., Awaitable[dict]]):
+    """
+    Generate every exam of a cycle that is not yet done. Dates run in
+    parallel up to the cycle's maxConcurrency; progress is checkpointed
+    per exam, so calling this again resumes where a failed run stopped.
+    The final status is set only once every date has stopped.
+    """
+    db = get_db()
+    cycle = await db.allocationcycles.find_one({"_id": cycle_id})
+    await db.allocationcycles.update_one(
+        {"_id": cycle_id}, {"$set": {"status": "running", "updatedAt": datetime.utcnow()}}
+    )
+    by_day = defaultdict(list)
+    for entry in cycle["exams"]:
+        if entry["status"] != "done":
+            by_day[entry["date"].date()].append(entry)
+
+    limiter = asyncio.Semaphore(cycle.get("maxConcurrency", 1))
+    status = "failed"
+    try:
+        # A failing date must not orphan the others: wait for all of them
+        results = await asyncio.gather(
+            *(
+                _run_day(cycle_id, day, entries, generate_exam, limiter)
+                for day, entries in by_day.items()
+            ),
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        for error in errors:
+            print(f"Cycle {cycle_id}: a date stopped early: {error}")
+        cycle = await db.allocationcycles.find_one({"_id": cycle_id}, {"exams.status": 1})
+        if not errors and not any(e["status"] == "failed" for e in cycle["exams"]):
+            status = "completed"
+    finally:
+        await db.allocationcycles.update_one(
+            {"_id": cycle_id}, {"$set": {"status": status, "updatedAt": datetime.utcnow()}}
+        )
+
+
+def start_cycle(cycle_id, generate_exam) -> bool:
+    """Run a cycle in the background. Returns False if it is already running here."""
+    key = str(cycle_id)
+    if key in _running:
+        return False
+    task = asyncio.ensure_future(run_cycle(cycle_id, generate_exam))
+    _running[key] = task
+    task.add_done_callback(lambda t: _cycle_finished(key, t))
+    return True
+
+
+def _cycle_finished(key: str, task: asyncio.Task):
+    _running.pop(key, None)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Cycle {key} failed: {task.exception()}")
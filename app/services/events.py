@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime
+from typing import Optional, Set
+from pymongo.errors import OperationFailure, PyMongoError
+
+from config.database import get_db
+
+SUBSCRIBER_QUEUE_SIZE = 100
+WATCH_RETRY_SECONDS = 5
+
+_OPERATIONS = {"insert": "created", "update": "updated", "replace": "updated", "delete": "deleted"}
+
+
+class _Subscription:
+    def __init__(self, exam_id: Optional[str]):
+        self.exam_id = exam_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+
+class EventBus:
+    """In-process fan-out of small allocation change notifications."""
+
+    def __init__(self):
+        self._subscribers: Set[_Subscription] = set()
+        self._seq = 0
+
+    def subscribe(self, exam_id: Optional[str] = None) -> _Subscription:
+        sub = _Subscription(exam_id)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: _Subscription):
+        self._subscribers.discard(sub)
+
+    def publish(self, event: dict):
+        self._seq += 1
+        event = {"id": self._seq, **event}
+        for sub in list(self._subscribers):
+            if sub.exam_id and event.get("examId") not in (None, sub.exam_id):
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: it only needs to know something changed
+                pass
+
+
+bus = EventBus()
+
+# True while a change stream feeds the bus, so routes must not publish twice
+_change_stream_active = False
+
+
+def _event(kind: str, exam_id, allocation_id) -> dict:
+    return {
+        "type": f"allocation.{kind}",
+        "examId": str(exam_id) if exam_id else None,
+        "allocationId": str(allocation_id) if allocation_id else None,
+        "at": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+def publish_allocation_event(kind: str, exam_id, allocation_id):
+    """
+    Called by the allocation routes after a write. Skipped when the change
+    stream is running, since it reports writes from every worker.
+    """
+    if not _change_stream_active:
+        bus.publish(_event(kind, exam_id, allocation_id))
+
+
+async def watch_allocations():
+    """
+    Background task: feed the bus from a MongoDB change stream on
+    `allocations` so clients hear about writes made by any worker.
+    Change streams need a replica set; on a standalone server this
+    returns and the routes' in-process events are used instead.
+    """
+    global _change_stream_active
+    db = get_db()
+    # Lets delete events carry the examId (MongoDB 6.0+); optional
+    try:
+        await db.command("collMod", "allocations", changeStreamPreAndPostImages={"enabled": True})
+    except PyMongoError:
+        pass
+
+    resume_token = None
+    while True:
+        try:
+            async with db.allocations.watch(
+                [{"$match": {"operationType": {"$in": list(_OPERATIONS)}}}],
+                full_document="updateLookup",
+                full_document_before_change="whenAvailable",
+                resume_after=resume_token,
+            ) as stream:
+                _change_stream_active = True
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    doc = change.get("fullDocument") or change.get("fullDocumentBeforeChange") or {}
+                    bus.publish(
+                        _event(
+                            _OPERATIONS[change["operationType"]],
+                            doc.get("examId"),
+                            change["documentKey"]["_id"],
+                        )
+                    )
+        except OperationFailure as e:
+            _change_stream_active = False
+            if e.code == 40573:  # change streams unsupported (standalone)
+                print("Change streams unavailable; using in-process allocation events.")
+                return
+            print(f"Allocation change stream failed: {e}")
+        except PyMongoError as e:
+            _change_stream_active = False
+            print(f"Allocation change stream interrupted: {e}")
+        await asyncio.sleep(WATCH_RETRY_SECONDS)
@@ -0,0 +1,225 @@
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from config.database import get_db
+
+load_dotenv()
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "4"))
+DOOR_LIST_CHUNK = 1000
+# XLSX/PDF are spooled to disk once they grow past this size
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+FILE_CHUNK_BYTES = 64 * 1024
+
+ROOM_COLUMNS = ["Room", "Block", "Seat", "USN", "Name", "Department", "Invigilators"]
+DOOR_LIST_COLUMNS = ["USN", "Name", "Department", "Room", "Block", "Seat"]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+
+
+class ExportDependencyMissing(Exception):
+    """The optional library needed for a format is not installed."""
+
+
+# ── Data loading (one query per collection) ──────────────────
+async def load_seating(exam_id):
+    """
+    Load an exam's allocation as a list of rooms with resolved students
+    and staff. Returns None if the exam has no allocation.
+    """
+    db = get_db()
+    alloc = await db.allocations.find_one({"examId": exam_id})
+    if not alloc:
+        return None
+    room_allocs = alloc.get("roomAllocations", [])
+
+    student_ids = [sid for ra in room_allocs for sid in ra.get("studentsAssigned", [])]
+    staff_ids = [sid for ra in room_allocs for sid in ra.get("staffAssigned", [])]
+    students = {
+        s["_id"]: s
+        async for s in db.students.find(
+            {"_id": {"$in": student_ids}}, {"usn": 1, "name": 1, "department": 1}
+        )
+    }
+    staff = {
+        s["_id"]: s
+        async for s in db.staffs.find({"_id": {"$in": staff_ids}}, {"name": 1})
+    }
+
+    rooms = []
+    for ra in room_allocs:
+        # Grid label (R2C5) when the engine placed seats, else running number
+        labels = {s["student"]: f"R{s['row']}C{s['column']}" for s in ra.get("seats", [])}
+        seated = []
+        for seat, sid in enumerate(ra.get("studentsAssigned", []), start=1):
+            student = students.get(sid)
+            if student:
+                seated.append(
+                    {
+                        "seat": labels.get(sid, seat),
+                        "usn": student.get("usn", ""),
+                        "name": student.get("name", ""),
+                        "department": student.get("department", ""),
+                    }
+                )
+        rooms.append(
+            {
+                "roomNumber": ra.get("roomNumber", ""),
+                "block": ra.get("block", ""),
+                "invigilators": [staff[s]["name"] for s in ra.get("staffAssigned", []) if s in staff],
+                "students": seated,
+            }
+        )
+    return rooms
+
+
+def door_list(rooms):
+    """Flatten rooms into USN-sorted door list rows."""
+    rows = [
+        {**s, "roomNumber": room["roomNumber"], "block": room["block"]}
+        for room in rooms
+        for s in room["students"]
+    ]
+    rows.sort(key=lambda r: r["usn"])
+    return rows
+
+
+def _room_rows(room):
+    invigilators = ", ".join(room["invigilators"])
+    return [
+        [room["roomNumber"], room["block"], s["seat"], s["usn"], s["name"], s["department"], invigilators]
+        for s in room["students"]
+    ]
+
+
+def _door_rows(rows):
+    return [
+        [r["usn"], r["name"], r["department"], r["roomNumber"], r["block"], r["seat"]]
+        for r in rows
+    ]
+
+
+# ── CSV (rendered per room on the worker pool, streamed in order)
+def _render_csv(rows) -> bytes:
+    out = io.StringIO()
+    csv.writer(out).writerows(rows)
+    return out.getvalue().encode("utf-8")
+
+
+async def _stream_in_order(render, parts):
+    """Render parts on the worker pool, yielding results in order with a bounded look-ahead."""
+    loop = asyncio.get_running_loop()
+    window = deque()
+    for part in parts:
+        window.append(loop.run_in_executor(_executor, render, part))
+        if len(window) >= EXPORT_WORKERS * 2:
+            yield await window.popleft()
+    while window:
+        yield await window.popleft()
+
+
+async def stream_csv(rooms, view: str):
+    if view == "doorlist":
+        rows = door_list(rooms)
+        yield _render_csv([DOOR_LIST_COLUMNS])
+        chunks = (rows[i:i + DOOR_LIST_CHUNK] for i in range(0, len(rows), DOOR_LIST_CHUNK))
+        async for chunk in _stream_in_order(lambda c: _render_csv(_door_rows(c)), chunks):
+            yield chunk
+    else:
+        yield _render_csv([ROOM_COLUMNS])
+        async for chunk in _stream_in_order(lambda r: _render_csv(_room_rows(r)), rooms):
+            yield chunk
+
+
+# ── XLSX / PDF (built off the event loop, streamed from a spool file)
+def _sheet_title(room):
+    title = f"{room['block']} {room['roomNumber']}"
+    for ch in "[]:*?/\\":
+        title = title.replace(ch, "-")
+    return title[:31]
+
+
+def _build_xlsx(rooms, view: str):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportDependencyMissing("XLSX export requires the 'openpyxl' package")
+    wb = Workbook(write_only=True)
+    if view == "doorlist":
+        ws = wb.create_sheet("Door List")
+        ws.append(DOOR_LIST_COLUMNS)
+        for row in _door_rows(door_list(rooms)):
+            ws.append(row)
+    else:
+        used = set()
+        for room in rooms:
+            title = _sheet_title(room)
+            while title in used:
+                title = title[:28] + f"~{len(used)}"
+            used.add(title)
+            ws = wb.create_sheet(title)
+            ws.append(ROOM_COLUMNS)
+            for row in _room_rows(room):
+                ws.append(row)
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    wb.save(spool)
+    spool.seek(0)
+    return spool
+
+
+def _build_pdf(rooms, view: str, title: str):
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table
+    except ImportError:
+        raise ExportDependencyMissing("PDF export requires the 'reportlab' package")
+    styles = getSampleStyleSheet()
+    story = []
+    if view == "doorlist":
+        story.append(Paragraph(f"{title} — Door List", styles["Title"]))
+        story.append(Table([DOOR_LIST_COLUMNS] + _door_rows(door_list(rooms)), repeatRows=1))
+    else:
+        for room in rooms:
+            story.append(Paragraph(f"{title} — {room['block']} {room['roomNumber']}", styles["Title"]))
+            story.append(Paragraph("Invigilators: " + ", ".join(room["invigilators"]), styles["Normal"]))
+            rows = [[s["seat"], s["usn"], s["name"], s["department"]] for s in room["students"]]
+            story.append(Table([["Seat", "USN", "Name", "Department"]] + rows, repeatRows=1))
+            story.append(PageBreak())
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    SimpleDocTemplate(spool, pagesize=A4, title=title).build(story)
+    spool.seek(0)
+    return spool
+
+
+def _iter_file(spool):
+    try:
+        while True:
+            chunk = spool.read(FILE_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
+
+
+async def build_document(rooms, fmt: str, view: str, title: str):
+    """Build an XLSX or PDF on the worker pool and return a chunk iterator."""
+    loop = asyncio.get_running_loop()
+    if fmt == "xlsx":
+        spool = await loop.run_in_executor(_executor, _build_xlsx, rooms, view)
+    else:
+        spool = await loop.run_in_executor(_executor, _build_pdf, rooms, view, title)
+    return _iter_file(spool)
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError
+
+from config.database import get_db
+
+load_dotenv()
+
+LEASE_SECONDS = int(os.getenv("GENERATION_LEASE_SECONDS", "60"))
+ATTACH_TIMEOUT_SECONDS = float(os.getenv("GENERATION_ATTACH_TIMEOUT_SECONDS", "120"))
+POLL_INTERVAL_SECONDS = 0.25
+
+# Generations running in this worker, keyed by exam id
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+class GenerationBusy(Exception):
+    """Another worker holds the lease but produced no allocation in time."""
+
+    def __init__(self, message="Another worker is still generating this allocation"):
+        super().__init__(message)
+
+
+# ── Per-exam lease (allocationlocks collection) ──────────────
+async def acquire_lease(exam_id) -> Optional[str]:
+    """Take the generation lease for an exam. Returns an owner token or None."""
+    db = get_db()
+    owner = uuid.uuid4().hex
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=LEASE_SECONDS)
+    try:
+        await db.allocationlocks.insert_one(
+            {"_id": exam_id, "owner": owner, "expiresAt": expires}
+        )
+        return owner
+    except DuplicateKeyError:
+        pass
+    # Take over a lease whose holder died without releasing it
+    taken = await db.allocationlocks.find_one_and_update(
+        {"_id": exam_id, "expiresAt": {"$lt": now}},
+        {"$set": {"owner": owner, "expiresAt": expires}},
+    )
+    return owner if taken else None
+
+
+async def release_lease(exam_id, owner: str):
+    db = get_db()
+    await db.allocationlocks.delete_one({"_id": exam_id, "owner": owner})
+
+
+async def _keep_lease_alive(exam_id, owner: str):
+    db = get_db()
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        await db.allocationlocks.update_one(
+            {"_id": exam_id, "owner": owner},
+            {"$set": {"expiresAt": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)}},
+        )
+
+
+@asynccontextmanager
+async def hold_lease(key, message: str, wait_seconds: float = ATTACH_TIMEOUT_SECONDS):
+    """
+    Hold the lease on `key` for the duration of the block, waiting up to
+    `wait_seconds` for another holder to let go. Raises
+    GenerationBusy(message) if it never does.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait_seconds
+    owner = await acquire_lease(key)
+    while not owner:
+        if loop.time() >= deadline:
+            raise GenerationBusy(message)
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        owner = await acquire_lease(key)
+    keep_alive = asyncio.ensure_future(_keep_lease_alive(key, owner))
+    try:
+        yield
+    finally:
+        keep_alive.cancel()
+        await release_lease(key, owner)
+
+
+def _is_result(alloc, newer_than: Optional[int]) -> bool:
+    return alloc is not None and (
+        newer_than is None or alloc.get("version", 1) > newer_than
+    )
+
+
+async def wait_for_allocation(exam_id, newer_than: Optional[int] = None):
+    """
+    Poll until another worker's generation for this exam finishes.
+    With `newer_than`, only an allocation past that version counts, so a
+    regenerate does not mistake the old allocation for the new one.
+    Returns the allocation, or None if the lease was released without one.
+    """
+    db = get_db()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ATTACH_TIMEOUT_SECONDS
+    while loop.time() < deadline:
+        alloc = await db.allocations.find_one({"examId": exam_id})
+        if _is_result(alloc, newer_than):
+            return alloc
+        if not await db.allocationlocks.find_one({"_id": exam_id}, {"_id": 1}):
+            # The holder may have written and released since the first read
+            alloc = await db.allocations.find_one({"examId": exam_id})
+            return alloc if _is_result(alloc, newer_than) else None
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+    raise GenerationBusy()
+
+
+async def _lease_and_run(exam_id, generate, load_existing, newer_than):
+    db = get_db()
+    for _ in range(2):
+        owner = await acquire_lease(exam_id)
+        if owner:
+            keep_alive = asyncio.ensure_future(_keep_lease_alive(exam_id, owner))
+            try:
+                # Another worker may have saved and released just before we got the lease
+                existing = await db.allocations.find_one({"examId": exam_id})
+                if _is_result(existing, newer_than):
+                    return await load_existing(existing), True
+                return await generate(), False
+            finally:
+                keep_alive.cancel()
+                await release_lease(exam_id, owner)
+        existing = await wait_for_allocation(exam_id, newer_than)
+        if existing is not None:
+            return await load_existing(existing), True
+        # Holder gave up without writing — try to take the lease ourselves
+    raise GenerationBusy()
+
+
+async def run_exclusive(
+    exam_id,
+    generate: Callable[[], Awaitable[dict]],
+    load_existing: Callable[[dict], Awaitable[dict]],
+    newer_than: Optional[int] = None,
+) -> Tuple[dict, bool]:
+    """
+    Run `generate` at most once per exam across all workers.
+
+    Concurrent callers in this worker share the same task; callers in other
+    workers wait on the lease and receive the stored allocation via
+    `load_existing`. Pass `newer_than` (the version being replaced) when
+    regenerating, so waiters only accept a newer version. Returns
+    (result, attached) where `attached` is True when the result came from
+    someone else's generation.
+    """
+    key = str(exam_id)
+    task = _inflight.get(key)
+    if task is not None:
+        result, _ = await asyncio.shield(task)
+        return result, True
+
+    task = asyncio.ensure_future(_lease_and_run(exam_id, generate, load_existing, newer_than))
+    _inflight[key] = task
+    task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+# ── Idempotency-Key replay (idempotencykeys collection) ──────
+async def get_idempotent_response(key: str) -> Optional[dict]:
+    db = get_db()
+    return await db.idempotencykeys.find_one({"_id": key})
+
+
+async def save_idempotent_response(key: str, exam_id: str, body: dict):
+    db = get_db()
+    try:
+        await db.idempotencykeys.insert_one(
+            {"_id": key, "examId": exam_id, "body": body, "createdAt": datetime.utcnow()}
+        )
+    except DuplicateKeyError:
+        pass
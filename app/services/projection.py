@@ -0,0 +1,25 @@
+from typing import Optional, Set
+from fastapi import HTTPException
+
+
+def model_fields(model) -> Set[str]:
+    """Field names a client may request for a response model (id is `_id`)."""
+    return {"_id" if name == "id" else name for name in model.model_fields}
+
+
+def parse_fields(fields: Optional[str], allowed: Set[str], param: str = "fields") -> Optional[dict]:
+    """
+    Turn a sparse fieldset like `usn,name` into a MongoDB projection.
+    Returns None (whole document) when no fields were requested.
+    `_id` is always included.
+    """
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {param}: {', '.join(sorted(unknown))}",
+        )
+    return {f: 1 for f in requested}
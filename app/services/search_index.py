@@ -0,0 +1,251 @@
+import asyncio
+import os
+import re
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure, PyMongoError
+
+from config.database import get_db
+
+load_dotenv()
+
+REFRESH_INTERVAL_SECONDS = int(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "300"))
+BACKFILL_BATCH = 1000
+
+WATCH_RETRY_SECONDS = 5
+
+# Lowercased copy of `name` and its words, indexed so the fallback can run
+# case-sensitive anchored regexes (a bounded index scan, unlike $options "i")
+# and match the start of any word, like the in-memory index
+NAME_KEY = "nameLower"
+WORDS_KEY = "nameWords"
+NAME_KEYS = (NAME_KEY, WORDS_KEY)
+
+
+def name_key(name) -> str:
+    return str(name).lower()
+
+
+def with_name_key(doc: dict) -> dict:
+    """Add the lowercased name keys to a document (or $set payload) carrying `name`."""
+    if doc.get("name"):
+        doc[NAME_KEY] = name_key(doc["name"])
+        doc[WORDS_KEY] = doc[NAME_KEY].split()
+    return doc
+
+
+async def backfill_name_keys(collection: str):
+    """Add the name keys to documents written without them (e.g. by the seed script)."""
+    db = get_db()
+    ops = []
+    async for doc in db[collection].find(
+        {WORDS_KEY: {"$exists": False}, "name": {"$type": "string"}}, {"name": 1}
+    ):
+        # Matching on name too, so a concurrent rename is never overwritten
+        ops.append(UpdateOne(
+            {"_id": doc["_id"], "name": doc["name"]},
+            {"$set": with_name_key({"name": doc["name"]})},
+        ))
+        if len(ops) >= BACKFILL_BATCH:
+            await db[collection].bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        await db[collection].bulk_write(ops, ordered=False)
+
+
+class PrefixIndex:
+    """
+    In-memory prefix index over a collection: a sorted list of
+    ("<field>:<lowercased key>", id) entries searched with bisect.
+
+    USNs are indexed whole; names are indexed whole and per word so
+    "kum" finds "Anil Kumar". Lookups are O(log n + page size); writes
+    are O(n) memmove, which stays sub-millisecond at 100k documents.
+    """
+
+    def __init__(self, collection: str, fields: List[str], projection: dict):
+        self.collection = collection
+        self.fields = fields
+        self.projection = projection
+        self.ready = False
+        self._entries: List[tuple] = []
+        self._docs: Dict[str, dict] = {}
+        self._keys: Dict[str, List[str]] = {}
+        # Writes seen while load() reads its snapshot, replayed onto it
+        self._pending: Optional[list] = None
+
+    def _keys_for(self, doc) -> List[str]:
+        keys = set()
+        for field in self.fields:
+            value = doc.get(field)
+            if not value:
+                continue
+            value = str(value).lower()
+            keys.add(f"{field}:{value}")
+            if field == "name":
+                keys.update(f"name:{word}" for word in value.split()[1:])
+        return sorted(keys)
+
+    def _summary(self, doc) -> dict:
+        return {"_id": str(doc["_id"]), **{k: doc[k] for k in self.projection if k in doc}}
+
+    def upsert(self, doc):
+        """Add or replace one document. `doc` must carry the indexed fields."""
+        if self._pending is not None:
+            self._pending.append((self._upsert, doc))
+        self._upsert(doc)
+
+    def remove(self, doc_id):
+        if self._pending is not None:
+            self._pending.append((self._remove, doc_id))
+        self._remove(doc_id)
+
+    def _upsert(self, doc):
+        doc_id = str(doc["_id"])
+        self._remove(doc_id)
+        keys = self._keys_for(doc)
+        for key in keys:
+            insort(self._entries, (key, doc_id))
+        self._keys[doc_id] = keys
+        self._docs[doc_id] = self._summary(doc)
+
+    def _remove(self, doc_id):
+        doc_id = str(doc_id)
+        for key in self._keys.pop(doc_id, []):
+            i = bisect_left(self._entries, (key, doc_id))
+            if i < len(self._entries) and self._entries[i] == (key, doc_id):
+                del self._entries[i]
+        self._docs.pop(doc_id, None)
+
+    async def load(self):
+        """
+        Rebuild the index from MongoDB and swap it in. Writes made while
+        the cursor is read go to the live index and are also replayed
+        onto the new one, so they are not lost until the next refresh.
+        """
+        db = get_db()
+        docs, keys, entries = {}, {}, []
+        self._pending = []
+        try:
+            async for doc in db[self.collection].find({}, self.projection):
+                doc_id = str(doc["_id"])
+                docs[doc_id] = self._summary(doc)
+                keys[doc_id] = self._keys_for(doc)
+                entries.extend((key, doc_id) for key in keys[doc_id])
+            entries.sort()
+            self._entries, self._docs, self._keys = entries, docs, keys
+            for apply, arg in self._pending:
+                apply(arg)
+        finally:
+            self._pending = None
+        self.ready = True
+
+    def search(self, fields: List[str], prefix: str, offset: int, limit: int):
+        """Return (page, has_more) of documents whose fields start with prefix."""
+        prefix = prefix.lower()
+        seen, matches = set(), []
+        wanted = offset + limit + 1
+        for field in fields:
+            start = f"{field}:{prefix}"
+            i = bisect_left(self._entries, (start,))
+            while i < len(self._entries) and len(matches) < wanted:
+                key, doc_id = self._entries[i]
+                if not key.startswith(start):
+                    break
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    matches.append(self._docs[doc_id])
+                i += 1
+        return matches[offset:offset + limit], len(matches) > offset + limit
+
+    async def search_db(self, fields: List[str], prefix: str, offset: int, limit: int):
+        """Fallback while the index is loading: anchored regexes use the field indexes."""
+        db = get_db()
+        # USNs are stored upper-case; names match the whole name or any word
+        clauses = []
+        for f in fields:
+            if f == "usn":
+                clauses.append({"usn": {"$regex": "^" + re.escape(prefix.upper())}})
+            else:
+                pattern = "^" + re.escape(prefix.lower())
+                clauses.append({NAME_KEY: {"$regex": pattern}})
+                clauses.append({WORDS_KEY: {"$regex": pattern}})
+        sort_field = NAME_KEY if fields[0] == "name" else fields[0]
+        cursor = (
+            db[self.collection].find({"$or": clauses}, self.projection)
+            .sort(sort_field, 1).skip(offset).limit(limit + 1)
+        )
+        docs = [self._summary(d) async for d in cursor]
+        return docs[:limit], len(docs) > limit
+
+    async def query(self, fields: List[str], prefix: str, offset: int, limit: int):
+        if self.ready:
+            return self.search(fields, prefix, offset, limit)
+        return await self.search_db(fields, prefix, offset, limit)
+
+
+student_index = PrefixIndex(
+    "students", ["usn", "name"], {"usn": 1, "name": 1, "semester": 1, "department": 1}
+)
+staff_index = PrefixIndex(
+    "staffs", ["name"], {"name": 1, "department": 1, "designation": 1, "isAvailable": 1}
+)
+
+
+async def refresh_periodically():
+    """
+    Background task: load the indexes, then reload them every interval.
+    Change streams (watch_search_indexes) carry other workers' writes; the
+    reload is the backstop for standalone servers and missed events.
+    """
+    while True:
+        for index in (student_index, staff_index):
+            try:
+                await backfill_name_keys(index.collection)
+                await index.load()
+            except Exception as e:
+                print(f"Search index load failed ({index.collection}): {e}")
+        await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+
+
+async def _watch_index(index: PrefixIndex):
+    db = get_db()
+    resume_token = None
+    resync = False
+    while True:
+        try:
+            async with db[index.collection].watch(
+                [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}],
+                full_document="updateLookup",
+                resume_after=resume_token,
+            ) as stream:
+                if resync:
+                    # Events were lost while the stream was down
+                    await index.load()
+                    resync = False
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    if change["operationType"] == "delete":
+                        index.remove(change["documentKey"]["_id"])
+                    elif change.get("fullDocument"):
+                        index.upsert(change["fullDocument"])
+        except OperationFailure as e:
+            if e.code == 40573:  # change streams unsupported (standalone)
+                print(f"Change streams unavailable; {index.collection} search uses periodic reloads.")
+                return
+            print(f"Search index change stream failed ({index.collection}): {e}")
+            resume_token, resync = None, True
+        except PyMongoError as e:
+            print(f"Search index change stream interrupted ({index.collection}): {e}")
+        await asyncio.sleep(WATCH_RETRY_SECONDS)
+
+
+async def watch_search_indexes():
+    """
+    Background task: keep every worker's indexes in sync with writes made
+    through any worker, via change streams on students and staffs.
+    Needs a replica set; on a standalone server it returns.
+    """
+    await asyncio.gather(_watch_index(student_index), _watch_index(staff_index))
@@ -0,0 +1,167 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from dotenv import load_dotenv
+
+from config.database import get_db
+from services.allocation_engine import compute_allocation, load_allocation_inputs
+
+load_dotenv()
+
+SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", str(os.cpu_count() or 2)))
+MAX_CONFIGURATIONS = 512
+
+# Score weights — department mix matters most, then filling rooms well
+WEIGHTS = {"mixQuality": 0.5, "fillRatio": 0.3, "roomSaving": 0.1, "staffSaving": 0.1}
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Never fork: the parent runs an event loop and Motor's threads
+        _pool = ProcessPoolExecutor(
+            max_workers=SIMULATION_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the worker processes (called on app shutdown)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _adjacent_pairs(filled: int, columns: int) -> int:
+    """Neighbour pairs among `filled` seats laid out row-major `columns` wide."""
+    full_rows, last = divmod(filled, columns)
+    horizontal = full_rows * (columns - 1) + max(last - 1, 0)
+    vertical = max(filled - columns, 0)
+    return horizontal + vertical
+
+
+def score_allocation(result, total_rooms: int, total_staff: int) -> dict:
+    """Compute comparable metrics and a weighted score (higher is better)."""
+    rooms = result["roomAllocations"]
+    used_capacity = sum(r["capacity"] for r in rooms)
+    staff_used = sum(len(r["staffAssigned"]) for r in rooms)
+    pairs = sum(
+        _adjacent_pairs(len(r["seats"]), r["seatLayout"]["columns"]) for r in rooms
+    )
+    metrics = {
+        "roomsUsed": len(rooms),
+        "staffUsed": staff_used,
+        "unallocatedCount": result["unallocatedCount"],
+        "adjacencyViolations": result["adjacencyViolations"],
+        "mixQuality": 1 - result["adjacencyViolations"] / pairs if pairs else 1.0,
+        "fillRatio": result["totalStudentsAllocated"] / used_capacity if used_capacity else 0.0,
+        "roomSaving": 1 - len(rooms) / total_rooms if total_rooms else 0.0,
+        "staffSaving": 1 - staff_used / total_staff if total_staff else 0.0,
+    }
+    score = sum(metrics[k] * w for k, w in WEIGHTS.items())
+    # Leaving students without a seat outweighs everything else
+    if result["totalStudents"]:
+        score -= result["unallocatedCount"] / result["totalStudents"]
+    metrics["score"] = round(score, 6)
+    return metrics
+
+
+def _select_rooms(classrooms, room_ids):
+    if room_ids is None:
+        return classrooms
+    wanted = set(room_ids)
+    return [c for c in classrooms if str(c["_id"]) in wanted]
+
+
+def _check_room_sets(classrooms, room_sets):
+    """Raise ValueError for an empty room set or ids that match no classroom."""
+    known = {str(c["_id"]) for c in classrooms}
+    for room_ids in room_sets or []:
+        if not room_ids:
+            raise ValueError("roomSets entries must list at least one classroom")
+        unknown = sorted(set(room_ids) - known)
+        if unknown:
+            raise ValueError(f"Unknown classroom ids in roomSets: {', '.join(unknown)}")
+
+
+def _evaluate_batch(students, classrooms, staff, configs):
+    """Worker-process entry point: run and score each configuration."""
+    scored = []
+    for config in configs:
+        rooms = _select_rooms(classrooms, config["roomIds"])
+        result = compute_allocation(students, rooms, staff, config["seed"], config["staffing"])
+        scored.append((config, score_allocation(result, len(classrooms), len(staff))))
+    return scored
+
+
+def build_configurations(request) -> list:
+    """Expand a SimulationRequest into the cross product of its options."""
+    seeds = request.seeds or [random.randrange(2**31) for _ in range(request.numSeeds)]
+    room_sets = request.roomSets or [None]
+    staffing = [s.model_dump() for s in request.staffing] if request.staffing else [None]
+    configs = [
+        {"seed": seed, "roomIds": rooms, "staffing": rules}
+        for rooms, rules, seed in itertools.product(room_sets, staffing, seeds)
+    ]
+    if len(configs) > MAX_CONFIGURATIONS:
+        raise ValueError(f"Too many configurations ({len(configs)} > {MAX_CONFIGURATIONS})")
+    return configs
+
+
+async def simulate(exam, request):
+    """
+    Evaluate every configuration in parallel worker processes without
+    writing an allocation. The best `request.top` candidates are
+    recomputed in full (results are deterministic per seed) and stored
+    in `allocationcandidates` so one can be committed later by id.
+    """
+    configs = build_configurations(request)
+    # Workers only need ids and departments, which keeps pickling cheap
+    students, classrooms, staff = await load_allocation_inputs(
+        exam["semester"], {"department": 1}
+    )
+    _check_room_sets(classrooms, request.roomSets)
+
+    workers = max(1, min(SIMULATION_WORKERS, len(configs)))
+    batches = [configs[i::workers] for i in range(workers)]
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(pool, _evaluate_batch, students, classrooms, staff, batch)
+            for batch in batches
+        )
+    )
+    scored = sorted(
+        (item for batch in results for item in batch),
+        key=lambda item: item[1]["score"],
+        reverse=True,
+    )[: request.top]
+
+    db = get_db()
+    now = datetime.utcnow()
+    candidates = []
+    for config, metrics in scored:
+        rooms = _select_rooms(classrooms, config["roomIds"])
+        result = await loop.run_in_executor(
+            None, compute_allocation, students, rooms, staff, config["seed"], config["staffing"]
+        )
+        doc = {
+            "examId": exam["_id"],
+            "config": config,
+            "metrics": metrics,
+            "result": result,
+            "createdAt": now,
+        }
+        insert_result = await db.allocationcandidates.insert_one(doc)
+        candidates.append(
+            {"candidateId": str(insert_result.inserted_id), "config": config, "metrics": metrics}
+        )
+    return {"evaluated": len(configs), "candidates": candidates}
@@ -0,0 +1,312 @@
+from datetime import datetime
+
+from config.database import get_db
+
+SUMMARY_FIELDS = [
+    "totalStudentsAllocated",
+    "totalRoomsUsed",
+    "totalStudents",
+    "unallocatedCount",
+    "adjacencyViolations",
+]
+ROOM_FIELDS = ["roomNumber", "block", "capacity", "seatLayout", "adjacencyViolations"]
+
+
+class VersionNotFound(Exception):
+    pass
+
+
+class VersionConflict(Exception):
+    """The live allocation changed since it was read."""
+
+
+# ── Exploded form: flat maps that are cheap to diff ──────────
+def explode(alloc) -> dict:
+    """
+    Flatten an allocation into rooms {roomId: meta}, students
+    {studentId: (roomId, row, column)} and staff {staffId: roomId}.
+    """
+    rooms, students, staff = {}, {}, {}
+    for ra in alloc.get("roomAllocations", []):
+        room_id = ra["room"]
+        rooms[room_id] = {k: ra.get(k) for k in ROOM_FIELDS}
+        seats = {s["student"]: (s["row"], s["column"]) for s in ra.get("seats", [])}
+        for order, sid in enumerate(ra.get("studentsAssigned", [])):
+            row, column = seats.get(sid, (None, order))
+            students[sid] = (room_id, row, column)
+        for sid in ra.get("staffAssigned", []):
+            staff[sid] = room_id
+    return {
+        "rooms": rooms,
+        "students": students,
+        "staff": staff,
+        "summary": {k: alloc.get(k) for k in SUMMARY_FIELDS},
+    }
+
+
+def implode(state: dict) -> dict:
+    """Rebuild roomAllocations from the exploded form."""
+    members = {room_id: [] for room_id in state["rooms"]}
+    for sid, (room_id, row, column) in state["students"].items():
+        members[room_id].append((row if row is not None else 0, column, sid))
+    staff = {room_id: [] for room_id in state["rooms"]}
+    for sid, room_id in state["staff"].items():
+        staff[room_id].append(sid)
+
+    room_allocs = []
+    for room_id, meta in state["rooms"].items():
+        seated = sorted(members[room_id], key=lambda m: (m[0], m[1]))
+        ra = {"room": room_id, **meta}
+        ra["staffAssigned"] = staff[room_id]
+        ra["studentsAssigned"] = [sid for _, _, sid in seated]
+        if meta.get("seatLayout"):
+            ra["seats"] = [{"student": sid, "row": r, "column": c} for r, c, sid in seated]
+        room_allocs.append(ra)
+    return {"roomAllocations": room_allocs, **state["summary"]}
+
+
+# ── Deltas ───────────────────────────────────────────────────
+def make_delta(newer: dict, older: dict) -> dict:
+    """
+    Reverse delta turning `newer` back into `older` (both exploded). Only
+    changed entries are stored; a None room means "absent in older".
+    """
+    students = [
+        [sid, *(older["students"].get(sid) or (None, None, None))]
+        for sid in newer["students"].keys() | older["students"].keys()
+        if newer["students"].get(sid) != older["students"].get(sid)
+    ]
+    staff = [
+        [sid, older["staff"].get(sid)]
+        for sid in newer["staff"].keys() | older["staff"].keys()
+        if newer["staff"].get(sid) != older["staff"].get(sid)
+    ]
+    rooms = [
+        {"room": room_id, **meta}
+        for room_id, meta in older["rooms"].items()
+        if newer["rooms"].get(room_id) != meta
+    ]
+    rooms_removed = [room_id for room_id in newer["rooms"] if room_id not in older["rooms"]]
+    return {
+        "students": students,
+        "staff": staff,
+        "rooms": rooms,
+        "roomsRemoved": rooms_removed,
+        "summary": older["summary"],
+    }
+
+
+def apply_delta(state: dict, delta: dict) -> dict:
+    """Apply a reverse delta in place, returning the older state."""
+    for room in delta["rooms"]:
+        room = dict(room)
+        state["rooms"][room.pop("room")] = room
+    for room_id in delta["roomsRemoved"]:
+        state["rooms"].pop(room_id, None)
+    for sid, room_id, row, column in delta["students"]:
+        if room_id is None:
+            state["students"].pop(sid, None)
+        else:
+            state["students"][sid] = (room_id, row, column)
+    for sid, room_id in delta["staff"]:
+        if room_id is None:
+            state["staff"].pop(sid, None)
+        else:
+            state["staff"][sid] = room_id
+    state["summary"] = delta["summary"]
+    return state
+
+
+def delta_size(delta: dict) -> int:
+    return (
+        len(delta["students"]) + len(delta["staff"])
+        + len(delta["rooms"]) + len(delta["roomsRemoved"])
+    )
+
+
+def compare(a: dict, b: dict) -> dict:
+    """Human-facing diff from state `a` to state `b` (both exploded)."""
+    def moves(before, after, key):
+        out = []
+        for sid in before.keys() | after.keys():
+            src = before.get(sid)
+            dst = after.get(sid)
+            src_room = src[0] if isinstance(src, tuple) else src
+            dst_room = dst[0] if isinstance(dst, tuple) else dst
+            if src_room != dst_room:
+                out.append({key: sid, "fromRoom": src_room, "toRoom": dst_room})
+        return out
+
+    return {
+        "studentsMoved": moves(a["students"], b["students"], "student"),
+        "staffMoved": moves(a["staff"], b["staff"], "staff"),
+        "roomsAdded": [r for r in b["rooms"] if r not in a["rooms"]],
+        "roomsRemoved": [r for r in a["rooms"] if r not in b["rooms"]],
+    }
+
+
+# ── Storage (allocationversions collection) ──────────────────
+async def replace_allocation(current: dict, fields: dict, session=None) -> dict:
+    """
+    Write `fields` over the live allocation as the next version and store
+    the reverse delta back to `current`. The update only matches while the
+    live document is still at `current`'s version, so a concurrent writer
+    raises VersionConflict instead of forking the history. Returns the
+    fields written (including version and updatedAt).
+    """
+    db = get_db()
+    version = current.get("version", 1)
+    update = {**fields, "version": version + 1, "updatedAt": datetime.utcnow()}
+    result = await db.allocations.update_one(
+        {"_id": current["_id"], "version": current.get("version")},
+        {"$set": update},
+        session=session,
+    )
+    if not result.matched_count:
+        raise VersionConflict()
+    delta = make_delta(explode({**current, **update}), explode(current))
+    # Upsert: a delta left behind by an earlier failed write is overwritten
+    await db.allocationversions.replace_one(
+        {"allocationId": current["_id"], "version": version},
+        {
+            "allocationId": current["_id"],
+            "examId": current["examId"],
+            "version": version,
+            "delta": delta,
+            "changes": delta_size(delta),
+            "createdAt": current.get("updatedAt") or datetime.utcnow(),
+        },
+        upsert=True,
+        session=session,
+    )
+    return update
+
+
+async def record_deletion(current: dict, session=None):
+    """
+    Keep the last full version so history survives a delete. Write it
+    before deleting the live document; it is an upsert, so a retry after
+    a failed delete does not trip the unique (allocationId, version) index.
+    """
+    db = get_db()
+    version = current.get("version", 1)
+    await db.allocationversions.replace_one(
+        {"allocationId": current["_id"], "version": version},
+        {
+            "allocationId": current["_id"],
+            "examId": current["examId"],
+            "version": version,
+            "snapshot": current,
+            "changes": 0,
+            "createdAt": current.get("updatedAt") or datetime.utcnow(),
+        },
+        upsert=True,
+        session=session,
+    )
+
+
+async def _base(allocation_id):
+    """Latest full version: the live allocation or its deletion snapshot."""
+    db = get_db()
+    current = await db.allocations.find_one({"_id": allocation_id})
+    if current:
+        return current
+    tomb = await db.allocationversions.find_one(
+        {"allocationId": allocation_id, "snapshot": {"$exists": True}},
+        sort=[("version", -1)],
+    )
+    return tomb["snapshot"] if tomb else None
+
+
+async def list_versions(allocation_id):
+    db = get_db()
+    base = await _base(allocation_id)
+    if base is None:
+        return None
+    versions = [
+        {"version": v["version"], "changes": v["changes"], "createdAt": v["createdAt"]}
+        async for v in db.allocationversions.find(
+            {"allocationId": allocation_id, "delta": {"$exists": True}},
+            {"version": 1, "changes": 1, "createdAt": 1},
+        ).sort("version", -1)
+    ]
+    current = {
+        "version": base.get("version", 1),
+        "current": True,
+        "createdAt": base.get("updatedAt"),
+    }
+    return {"examId": base["examId"], "versions": [current] + versions}
+
+
+async def _walk_deltas(allocation_id, state: dict, low: int, latest: int):
+    """
+    Apply reverse deltas to `state` from `latest` down to `low`, yielding
+    each version as it is reached. Raises VersionNotFound if a delta in
+    the chain is missing, rather than rebuilding the wrong state.
+    """
+    db = get_db()
+    expected = latest - 1
+    async for v in db.allocationversions.find(
+        {
+            "allocationId": allocation_id,
+            "delta": {"$exists": True},
+            "version": {"$gte": low, "$lt": latest},
+        }
+    ).sort("version", -1):
+        if v["version"] != expected:
+            break
+        apply_delta(state, v["delta"])
+        yield expected
+        expected -= 1
+    if expected >= low:
+        raise VersionNotFound(f"Version {expected} is missing from the history")
+
+
+async def load_version_state(allocation_id, version: int):
+    """
+    Rebuild a version in exploded form by walking reverse deltas down from
+    the latest full version; cost is the total size of those deltas.
+    """
+    base = await _base(allocation_id)
+    if base is None or not 1 <= version <= base.get("version", 1):
+        raise VersionNotFound()
+    state = explode(base)
+    async for _ in _walk_deltas(allocation_id, state, version, base.get("version", 1)):
+        pass
+    return base, state
+
+
+async def rebuild_version(allocation_id, version: int) -> dict:
+    base, state = await load_version_state(allocation_id, version)
+    return {
+        "_id": base["_id"],
+        "examId": base["examId"],
+        "version": version,
+        **implode(state),
+    }
+
+
+def _copy_state(state: dict) -> dict:
+    return {
+        "rooms": {k: dict(v) for k, v in state["rooms"].items()},
+        "students": dict(state["students"]),
+        "staff": dict(state["staff"]),
+        "summary": dict(state["summary"] or {}),
+    }
+
+
+async def diff_versions(allocation_id, from_version: int, to_version: int) -> dict:
+    """Diff two versions with a single walk down the delta chain."""
+    base = await _base(allocation_id)
+    latest = base.get("version", 1) if base else 0
+    if not (1 <= from_version <= latest and 1 <= to_version <= latest):
+        raise VersionNotFound()
+    low, high = sorted((from_version, to_version))
+
+    state = explode(base)
+    high_state = _copy_state(state) if high == latest else None
+    async for version in _walk_deltas(allocation_id, state, low, latest):
+        if version == high:
+            high_state = _copy_state(state)
+    states = {low: state, high: high_state}
+    return compare(states[from_version], states[to_version])
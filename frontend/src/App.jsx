@@ -528,6 +528,15 @@ function AllocationsPage() {
       .catch(() => {})
   }, [])
 
+  // Refetch only when the server reports an allocation change
+  useEffect(() => {
+    const source = new EventSource(`${API_BASE_URL}/api/events/allocations`)
+    const onChange = () => refresh()
+    ;['allocation.created', 'allocation.updated', 'allocation.deleted']
+      .forEach(type => source.addEventListener(type, onChange))
+    return () => source.close()
+  }, [])
+
   const handleGenerate = async () => {
     if (!selectedExam) { alert('Please select an exam first.'); return }
     setGenerating(true)
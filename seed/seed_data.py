@@ -32,13 +32,13 @@ staff_data = [
 
 # ── Sample Classroom Data ────────────────────────────────────
 classroom_data = [
-    {"roomNumber": "A-101", "block": "BB", "capacity": 30},
-    {"roomNumber": "A-102", "block": "BB", "capacity": 40},
-    {"roomNumber": "A-103", "block": "BB", "capacity": 50},
-    {"roomNumber": "B-201", "block": "IS", "capacity": 35},
-    {"roomNumber": "B-202", "block": "IS", "capacity": 45},
+    {"roomNumber": "A-101", "block": "BB", "capacity": 30, "rows": 5, "columns": 6},
+    {"roomNumber": "A-102", "block": "BB", "capacity": 40, "rows": 5, "columns": 8},
+    {"roomNumber": "A-103", "block": "BB", "capacity": 50, "rows": 5, "columns": 10},
+    {"roomNumber": "B-201", "block": "IS", "capacity": 35, "rows": 5, "columns": 7},
+    {"roomNumber": "B-202", "block": "IS", "capacity": 45, "rows": 5, "columns": 9},
     {"roomNumber": "B-203", "block": "IS", "capacity": 30},
-    {"roomNumber": "C-301", "block": "EC", "capacity": 60},
+    {"roomNumber": "C-301", "block": "EC", "capacity": 60, "rows": 6, "columns": 10},
     {"roomNumber": "C-302", "block": "EC", "capacity": 40},
 ]
 